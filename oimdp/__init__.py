@@ -1,11 +1,25 @@
-from .parser import parser
+from .parser import Parser, parser
+from .writer import writer
+from .sidecar import parse_range
+from .kwic import concordance
+from .toc import extract_toc
+from . import extract
 
 
-def parse(text, strict = False):
-    return parser(text, strict)
+def parse(text, strict = False, errors = "raise", on_diagnostic = None):
+    return parser(text, strict, errors, on_diagnostic)
+
+
+def write(document, fp):
+    return writer(document, fp)
 
 
 __all__ = [
-   'parse'
+   'Parser',
+   'concordance',
+   'extract_toc',
+   'parse',
+   'parse_range',
+   'write'
 ]
 __version__ = '1.3.0'
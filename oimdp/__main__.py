@@ -0,0 +1,20 @@
+import argparse
+from .serve import serve
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(prog="oimdp", description="OpenITI mARkdown Parser")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="parse files or text sent to a Unix socket")
+    serve_parser.add_argument("--socket", required=True, help="path of the Unix socket to listen on")
+    serve_parser.add_argument("--workers", type=int, default=None,
+                              help="number of parser processes (default: number of CPUs)")
+
+    args = arg_parser.parse_args()
+    if args.command == "serve":
+        serve(args.socket, args.workers)
+
+
+if __name__ == "__main__":
+    main()
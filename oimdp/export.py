@@ -0,0 +1,35 @@
+import json
+from typing import List, TextIO
+from .structures import Document, Line
+
+
+def structure_to_dict(structure):
+    """Converts a content structure or line part to a dictionary of its attributes"""
+    if structure is None:
+        return None
+    d = {"type": type(structure).__name__}
+    for attr, value in vars(structure).items():
+        if isinstance(structure, Line) and attr == "parts":
+            value = [structure_to_dict(p) for p in value]
+        d[attr] = value
+    return d
+
+
+def to_dict(document: Document, profiles: List[str] = ()):
+    """Converts a Document object to JSON-serializable dictionaries and lists.
+
+    Lines include their text normalized with the given profiles, see oimdp.normalize.
+    """
+    for profile in profiles:
+        document.normalize(profile)
+    return {
+        "magic_value": document.magic_value.orig,
+        "simple_metadata": [structure_to_dict(md) for md in document.simple_metadata],
+        "content": [structure_to_dict(c) for c in document.content],
+        "diagnostics": [vars(d) for d in document.diagnostics],
+    }
+
+
+def dump(document: Document, fp: TextIO, profiles: List[str] = ()):
+    """Writes a Document object to a file object as JSON"""
+    json.dump(to_dict(document, profiles), fp, ensure_ascii=False)
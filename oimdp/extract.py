@@ -0,0 +1,250 @@
+"""Fast extraction of specific structures without building a Document.
+
+Extractors scan the lines of a source, which is either the text of a document or an iterable of lines
+such as an open file, and yield columnar batches: dictionaries of equally long lists, one per column.
+A batch can be turned into a table with e.g. `pyarrow.RecordBatch.from_pydict` or `pandas.DataFrame`.
+"""
+import re
+import sys
+from typing import Iterable, Union
+from .parser import MILESTONE_RE, PAGE_RE, MORPHO_RE, OPEN_TAG_RE, PARA_RE, REGION_RE, TOKEN_RE, WORD_RE, \
+    bio_or_event, dictionary_unit, is_bio_or_event, named_entity_tag, remove_phrase_lv_tags
+from .symbols import SYMBOLS
+from . import tags as t
+
+RWY_PARTS_RE = re.compile(f"({re.escape(t.MATN)}|{re.escape(t.HUKM)})")
+
+RIWAYAT_COLUMNS = ["id", "line", "isnad", "matn", "hukm", "volume", "page", "milestone"]
+ENTITY_COLUMNS = ["doc", "line", "structure", "type", "prefix", "extent", "text", "volume", "page", "milestone"]
+DATE_TAGS = [(t.YEAR_BIRTH, "Date", "birth"), (t.YEAR_DEATH, "Date", "death"), (t.YEAR_OTHER, "Date", "other"),
+             (t.YEAR_AGE, "Age", "age")]
+# Tokens of these kinds are skipped, in the order parse_line checks them
+SKIPPED_TAGS = [t.HEMI, t.MATN, t.HUKM, t.ROUTE_FROM, t.ROUTE_TOWA, t.ROUTE_DIST]
+
+
+def iter_lines(source: Union[str, Iterable[str]]):
+    """Iterates over the lines of a text or of an iterable of lines, without line breaks"""
+    if isinstance(source, str):
+        yield from source.splitlines()
+    else:
+        for line in source:
+            yield line.rstrip("\r\n")
+
+
+class Context:
+    """The last page number and milestone seen while scanning lines"""
+    def __init__(self):
+        self.volume = None
+        self.page = None
+        self.milestone = None
+
+    def update(self, line: str):
+        if t.PAGE in line:
+            for m in PAGE_RE.finditer(line):
+                self.volume = SYMBOLS.intern(m.group(1))
+                self.page = SYMBOLS.intern(m.group(2))
+        if "ms" in line or t.MILESTONE in line:
+            for m in MILESTONE_RE.finditer(line):
+                self.milestone = m.group()
+
+    def update_from_line(self, il: str):
+        """Updates the context from a line of the source. Like the parser, ignores the page numbers and
+        milestones of metadata, headers and other lines that are not split into line parts.
+        """
+        if il.startswith(t.PAGE):
+            self.update(il)
+        elif t.PAGE in il or "ms" in il or t.MILESTONE in il:
+            text = line_text(il)
+            if text is not None:
+                self.update(text)
+
+
+class Batches:
+    """Accumulates rows in columns and hands them over in batches"""
+    def __init__(self, columns: list, batch_size: int):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.new_batch()
+
+    def new_batch(self):
+        self.batch = {c: [] for c in self.columns}
+        self.size = 0
+
+    def add(self, *row):
+        """Adds a row and returns a full batch, if any"""
+        for column, value in zip(self.columns, row):
+            self.batch[column].append(value)
+        self.size += 1
+        if self.size >= self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        batch = self.batch
+        self.new_batch()
+        return batch
+
+
+def clean(fragments: list):
+    return " ".join(" ".join(fragments).split())
+
+
+def riwayat(source: Union[str, Iterable[str]], batch_size: int = 10000):
+    """Yields batches of riwāyāt with their isnād, matn and ḥukm as clean text.
+
+    A riwāyaŧ starts with a `# $RWY$` line and continues over the following `~~` lines, text before
+    `@MATN@` being the isnād. Columns are listed in RIWAYAT_COLUMNS: `id` is the order of the riwāyaŧ
+    in the source, `line` the index of its first line, and `volume`, `page` and `milestone` the last
+    ones seen before it starts.
+    """
+    batches = Batches(RIWAYAT_COLUMNS, batch_size)
+    context = Context()
+    current = None
+
+    def add_current():
+        rwy_id, line_index, parts, volume, page, milestone = current
+        return batches.add(rwy_id, line_index, clean(parts[t.RWY]), clean(parts[t.MATN]), clean(parts[t.HUKM]),
+                           volume, page, milestone)
+
+    count = 0
+    for i, il in enumerate(iter_lines(source)):
+        if il.startswith(t.RWY):
+            if current:
+                batch = add_current()
+                if batch:
+                    yield batch
+            current = (count, i, {t.RWY: [], t.MATN: [], t.HUKM: []}, context.volume, context.page, context.milestone)
+            count += 1
+            section = t.RWY
+            text = il[len(t.RWY):]
+        elif current and il.startswith(t.LINE):
+            text = il
+        elif current and (il.strip() == "" or il.startswith(t.PAGE)):
+            # Blank lines and page numbers don't interrupt a riwāyaŧ
+            context.update_from_line(il)
+            continue
+        else:
+            if current:
+                batch = add_current()
+                if batch:
+                    yield batch
+                current = None
+            context.update_from_line(il)
+            continue
+
+        context.update_from_line(il)
+        parts = current[2]
+        for token in RWY_PARTS_RE.split(text.replace(t.LINE, '')):
+            if token == t.MATN or token == t.HUKM:
+                section = token
+            elif token:
+                parts[section].append(MILESTONE_RE.sub('', remove_phrase_lv_tags(token)))
+
+    if current:
+        batch = add_current()
+        if batch:
+            yield batch
+    if batches.size:
+        yield batches.flush()
+
+
+def line_text(il: str):
+    """Returns the part of a line the parser splits into line parts, None for other lines"""
+    if il.startswith(t.META) or il.startswith(t.PAGE):
+        return None
+    if il.startswith(t.RWY):
+        return il[7:]
+    if il.startswith(t.ROUTE_FROM):
+        return il
+    if REGION_RE.search(il) or MORPHO_RE.search(il):
+        return None
+    if PARA_RE.search(il):
+        return il[1:]
+    if il.startswith(t.LINE):
+        return il
+    if il.startswith(t.HEADER):
+        return None
+    if il.startswith(t.DIC):
+        return dictionary_unit(il)[0]
+    if il.startswith(t.DOX):
+        for tag in t.DOXOGRAPHICAL:
+            il = il.replace(tag, '')
+        return il
+    if is_bio_or_event(il):
+        return bio_or_event(il)[0]
+    return None
+
+
+def line_entities(text: str, line_index: int, context: Context, doc):
+    """Returns the rows of the named entities, dates and ages of a line, splitting it as parse_line does"""
+    il = text.replace(t.LINE, '')
+    if remove_phrase_lv_tags(il) == "":
+        # parse_line drops the line
+        return []
+    rows = []
+    # The row of a named entity waiting for its words
+    pending = None
+    for token in TOKEN_RE.split(il):
+        if token == '':
+            continue
+        if t.PAGE in token and PAGE_RE.search(token):
+            context.update(token)
+            continue
+        if MILESTONE_RE.match(token):
+            context.milestone = token
+            continue
+        if token.startswith('@') and OPEN_TAG_RE.match(token):
+            continue
+        if any(tag in token for tag in SKIPPED_TAGS):
+            continue
+        date = next((d for d in DATE_TAGS if d[0] in token), None)
+        if date:
+            tag, structure, date_type = date
+            rows.append([doc, line_index, structure, date_type, None, None, sys.intern(token.replace(tag, '')),
+                         context.volume, context.page, context.milestone])
+            continue
+        ne_tag = named_entity_tag(token)
+        if ne_tag:
+            tag, ne_type = ne_tag
+            val = token.replace(tag, '')
+            if len(val) > 1 and val[0].isdigit() and val[1].isdigit():
+                pending = [doc, line_index, "NamedEntity", ne_type, int(val[0]), int(val[1]), "",
+                           context.volume, context.page, context.milestone]
+                rows.append(pending)
+                continue
+        # Text, including malformed tags
+        if pending is not None:
+            if pending[5] > 0:
+                pending[6] = " ".join(WORD_RE.findall(token)[:pending[5]])
+            pending = None
+    return rows
+
+
+def entities(source: Union[str, Iterable[str]], doc=None, batch_size: int = 10000):
+    """Yields batches of the named entities, dates and ages of a source.
+
+    Only lines with an `@` are split into tokens, with the same rules as the parser. Columns are listed
+    in ENTITY_COLUMNS:
+
+    - `doc`: the `doc` argument, to tell documents apart when combining their batches
+    - `line`: the index of the line
+    - `structure`: `NamedEntity`, `Date` or `Age`
+    - `type`: the `ne_type` of a named entity, the `date_type` of a date, or `age`
+    - `prefix` and `extent`: the number of prefix letters and of words of a named entity
+    - `text`: the words of a named entity or the value of a date or age
+    - `volume`, `page` and `milestone`: the last ones seen before the structure
+    """
+    batches = Batches(ENTITY_COLUMNS, batch_size)
+    context = Context()
+    for i, il in enumerate(iter_lines(source)):
+        if "@" in il:
+            text = line_text(il)
+            if text is not None:
+                for row in line_entities(text, i, context, doc):
+                    batch = batches.add(*row)
+                    if batch:
+                        yield batch
+                continue
+        context.update_from_line(il)
+    if batches.size:
+        yield batches.flush()
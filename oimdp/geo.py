@@ -0,0 +1,197 @@
+"""Route graphs and administrative region hierarchies built from parsed documents"""
+import re
+from array import array
+from heapq import heappop, heappush
+from typing import Callable, Iterable, List
+from .structures import AdministrativeRegion, Document, NamedEntity, RouteDist, RouteFrom, RouteOrDistance, RouteTowa
+from .structures import TextPart
+
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def distance_value(distance: str):
+    """Default route weight: the first number in the distance as recorded, or 1 for a single hop"""
+    m = NUMBER_RE.search(distance)
+    return float(m.group()) if m else 1.0
+
+
+def get_routes(document: Document):
+    """Iterates over the (from, towards, distance) texts of the routes in a document"""
+    for line in document.select(RouteOrDistance):
+        route = {RouteFrom: [], RouteTowa: [], RouteDist: []}
+        current = None
+        for part in line.parts:
+            if type(part) in route:
+                current = route[type(part)]
+            elif current is not None and isinstance(part, (TextPart, NamedEntity)):
+                current.append(str(part))
+        yield tuple(" ".join("".join(route[k]).split()) for k in (RouteFrom, RouteTowa, RouteDist))
+
+
+class RouteGraph:
+    """A graph of places connected by routes, stored as adjacency arrays.
+
+    Shortest paths from a place are computed on demand and cached, `precompute()` fills the
+    cache for all places.
+    """
+    def __init__(self, weight: Callable[[str], float] = distance_value, directed: bool = False):
+        self.weight = weight
+        self.directed = directed
+        self.places = []
+        self.place_ids = {}
+        self.edges = []
+        self.built = True
+        self.offsets = array("l", [0])
+        self.targets = array("l")
+        self.weights = array("d")
+        self.paths = {}
+
+    def place_id(self, place: str):
+        if place not in self.place_ids:
+            self.place_ids[place] = len(self.places)
+            self.places.append(place)
+        return self.place_ids[place]
+
+    def add_route(self, origin: str, destination: str, distance: str):
+        if not origin or not destination:
+            return
+        self.edges.append((self.place_id(origin), self.place_id(destination), self.weight(distance)))
+        self.built = False
+
+    def add_document(self, document: Document):
+        for route in get_routes(document):
+            self.add_route(*route)
+
+    def build(self):
+        """Builds the adjacency arrays from the routes added so far"""
+        if self.built:
+            return
+        edges = self.edges
+        if not self.directed:
+            edges = edges + [(b, a, w) for a, b, w in edges]
+        edges.sort()
+        self.offsets = array("l", [0] * (len(self.places) + 1))
+        for a, _, _ in edges:
+            self.offsets[a + 1] += 1
+        for i in range(len(self.places)):
+            self.offsets[i + 1] += self.offsets[i]
+        self.targets = array("l", [b for _, b, _ in edges])
+        self.weights = array("d", [w for _, _, w in edges])
+        self.paths = {}
+        self.built = True
+
+    def known_place_id(self, place: str):
+        if place not in self.place_ids:
+            raise ValueError(f"Unknown place: {place}")
+        return self.place_ids[place]
+
+    def neighbors(self, place: str):
+        """Gets the (place, distance) pairs directly connected to a place"""
+        self.build()
+        a = self.known_place_id(place)
+        return [(self.places[self.targets[e]], self.weights[e]) for e in range(self.offsets[a], self.offsets[a + 1])]
+
+    def shortest_paths_from(self, source: int):
+        """Runs Dijkstra's algorithm from a place id, returns distance and predecessor arrays"""
+        self.build()
+        if source in self.paths:
+            return self.paths[source]
+        n = len(self.places)
+        dist = array("d", [float("inf")]) * n
+        prev = array("l", [-1]) * n
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        while heap:
+            d, a = heappop(heap)
+            if d > dist[a]:
+                continue
+            for e in range(offsets[a], offsets[a + 1]):
+                b = targets[e]
+                nd = d + weights[e]
+                if nd < dist[b]:
+                    dist[b] = nd
+                    prev[b] = a
+                    heappush(heap, (nd, b))
+        self.paths[source] = (dist, prev)
+        return dist, prev
+
+    def precompute(self):
+        """Computes and caches the shortest paths between all places"""
+        for source in range(len(self.places)):
+            self.shortest_paths_from(source)
+
+    def shortest_path(self, origin: str, destination: str):
+        """Gets the distance and the list of places of the shortest path between two places.
+
+        Returns None if there is no path. Raises ValueError for places that are not in any route.
+        """
+        a = self.known_place_id(origin)
+        b = self.known_place_id(destination)
+        dist, prev = self.shortest_paths_from(a)
+        if dist[b] == float("inf"):
+            return None
+        path = [b]
+        while path[-1] != a:
+            path.append(prev[path[-1]])
+        return dist[b], [self.places[p] for p in reversed(path)]
+
+    def distance(self, origin: str, destination: str):
+        """Gets the length of the shortest path between two places, infinite if there is none.
+
+        Raises ValueError for places that are not in any route.
+        """
+        a = self.known_place_id(origin)
+        b = self.known_place_id(destination)
+        dist, _ = self.shortest_paths_from(a)
+        return dist[b]
+
+
+class RegionHierarchy:
+    """Administrative regions and their subdivisions"""
+    def __init__(self):
+        self.regions = {}
+        self.parents = {}
+
+    def add_region(self, region: AdministrativeRegion):
+        self.regions.setdefault(region.name, region)
+        for subdivision in region.subdivisions:
+            self.parents.setdefault(subdivision, region.name)
+
+    def add_document(self, document: Document):
+        for region in document.select(AdministrativeRegion):
+            self.add_region(region)
+
+    def children(self, name: str) -> List[str]:
+        region = self.regions.get(name)
+        return list(region.subdivisions) if region else []
+
+    def ancestors(self, name: str) -> List[str]:
+        """Gets the regions containing a region or settlement, from the closest one up"""
+        ancestors = []
+        while name in self.parents and self.parents[name] not in ancestors:
+            name = self.parents[name]
+            ancestors.append(name)
+        return ancestors
+
+
+def route_graph(documents: Iterable[Document], weight: Callable[[str], float] = distance_value,
+                directed: bool = False):
+    """Builds a RouteGraph from the routes of one or many documents"""
+    if isinstance(documents, Document):
+        documents = [documents]
+    graph = RouteGraph(weight, directed)
+    for document in documents:
+        graph.add_document(document)
+    graph.build()
+    return graph
+
+
+def region_hierarchy(documents: Iterable[Document]):
+    """Builds a RegionHierarchy from the administrative regions of one or many documents"""
+    if isinstance(documents, Document):
+        documents = [documents]
+    hierarchy = RegionHierarchy()
+    for document in documents:
+        hierarchy.add_document(document)
+    return hierarchy
@@ -0,0 +1,146 @@
+"""Keyword-in-context concordances over many documents"""
+import heapq
+import random
+import re
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Pattern, Union
+from .parser import parser
+from .structures import Document, Line, Milestone, NamedEntity, PageNumber, TextPart
+
+
+class KeywordInContext:
+    """An occurrence of a keyword with the words around it"""
+    def __init__(self, source: str, line_index: int, position: int, left: str, keyword: str, right: str,
+                 volume: str, page: str, milestone: str):
+        self.source = source
+        self.line_index = line_index
+        self.position = position
+        self.left = left
+        self.keyword = keyword
+        self.right = right
+        self.volume = volume
+        self.page = page
+        self.milestone = milestone
+
+    def __str__(self):
+        return f"{self.left} [{self.keyword}] {self.right}"
+
+
+def scan(document: Document, pattern: Pattern, window: int = 10, source: str = None):
+    """Iterates over the words of a document matching a pattern, with `window` words either side.
+
+    Context may span several lines. `volume`, `page` and `milestone` are the last ones seen before the
+    keyword and `position` is the index of the keyword among the words of its line.
+    """
+    recent = deque(maxlen=window)
+    pending = []
+    volume = page = milestone = None
+    for content in document.content:
+        if isinstance(content, PageNumber):
+            volume, page = content.volume, content.page
+        if not isinstance(content, Line):
+            continue
+        position = 0
+        for part in content.parts:
+            if isinstance(part, PageNumber):
+                volume, page = part.volume, part.page
+            elif isinstance(part, Milestone):
+                milestone = part.orig
+            elif isinstance(part, (TextPart, NamedEntity)):
+                for word in part.text.split():
+                    if pending:
+                        for hit in pending:
+                            hit[1].append(word)
+                        if len(pending[0][1]) >= window:
+                            done, right = pending.pop(0)
+                            done.right = " ".join(right)
+                            yield done
+                    if pattern.search(word):
+                        hit = KeywordInContext(source, content.line_index, position, " ".join(recent), word, "",
+                                               volume, page, milestone)
+                        if window > 0:
+                            pending.append((hit, []))
+                        else:
+                            yield hit
+                    recent.append(word)
+                    position += 1
+    for hit, right in pending:
+        hit.right = " ".join(right)
+        yield hit
+
+
+def collect(args):
+    """Scans a source file and keeps its best hits, run by worker processes"""
+    order, source, pattern, window, limit, sample, key, seed = args
+    with open(source, "r", encoding="utf-8") as f:
+        document = parser(f.read())
+    hits = scan(document, pattern, window, source)
+    if limit is None:
+        return list(hits)
+    rand = random.Random(None if seed is None else f"{seed}:{order}")
+    kept = []
+    for n, hit in enumerate(hits):
+        priority = rand.random() if sample else key(hit) if key else (order, n)
+        kept.append((priority, order, n, hit))
+        if len(kept) >= 2 * limit:
+            kept = heapq.nsmallest(limit, kept, key=lambda k: k[:3])
+    return kept
+
+
+def concordance(sources: Iterable[str], pattern: Union[str, Pattern], window: int = 10, limit: int = None,
+                sample: bool = False, key: Callable[[KeywordInContext], object] = None, processes: int = 1,
+                seed: int = None):
+    """Builds a keyword-in-context concordance of the words matching a pattern in many mARkdown files.
+
+    Files are parsed one at a time by each of `processes` worker processes. Without a `limit`, returns an iterator
+    over all hits, in order. With a `limit`, returns a list of at most `limit` hits: the first ones, the ones with
+    the smallest `key`, or a random sample if `sample` is set. Memory use is then bounded by the limit.
+    Without a limit, it is bounded by the hits of the `2 * processes` files read ahead, whatever the number of files.
+    With several processes, `key` must be a module-level function so that it can be sent to them.
+    """
+    if isinstance(pattern, str):
+        pattern = re.compile(pattern)
+    tasks = ((order, source, pattern, window, limit, sample, key, seed) for order, source in enumerate(sources))
+
+    if limit is None:
+        return stream(tasks, processes)
+
+    kept = []
+    for results in run(tasks, processes, ordered=False):
+        kept.extend(results)
+        if len(kept) >= 2 * limit:
+            kept = heapq.nsmallest(limit, kept, key=lambda k: k[:3])
+    return [k[3] for k in heapq.nsmallest(limit, kept, key=lambda k: k[:3])]
+
+
+def stream(tasks, processes: int):
+    for results in run(tasks, processes, ordered=True):
+        yield from results
+
+
+def run(tasks, processes: int, ordered: bool):
+    """Runs collect over the tasks and yields its results, with at most `2 * processes` files in flight"""
+    if processes <= 1:
+        yield from map(collect, tasks)
+        return
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(processes) as pool:
+        pending = deque(pool.submit(collect, task) for task in islice(tasks, 2 * processes))
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done = wait(pending, return_when=FIRST_COMPLETED).done
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    # One more file for each one done, so that the processes keep busy meanwhile
+                    for task in islice(tasks, 1):
+                        pending.append(pool.submit(collect, task))
+                    yield future.result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,74 @@
+"""Normalization of Arabic text with precompiled translation tables.
+
+A Profile chooses which normalizations apply. Profiles are registered by name in PROFILES:
+
+- `light`: remove diacritics and tatweel
+- `default`: also unify alef, yāʾ and tāʾ marbūṭa forms and map Arabic-Indic digits to ASCII digits
+"""
+from typing import Dict, Iterable, List, Union
+
+DIACRITICS = [chr(c) for c in [*range(0x064B, 0x0660), 0x0670, *range(0x06D6, 0x06DD), *range(0x06DF, 0x06E5),
+                               0x06E7, 0x06E8, *range(0x06EA, 0x06EE)]]
+TATWEEL = "ـ"
+ALEF = {"آ": "ا", "أ": "ا", "إ": "ا", "ٱ": "ا", "ٲ": "ا", "ٳ": "ا"}
+YA = {"ى": "ي", "ی": "ي"}
+TA_MARBUTA = {"ة": "ه"}
+DIGITS = {**{chr(0x0660 + d): str(d) for d in range(10)}, **{chr(0x06F0 + d): str(d) for d in range(10)}}
+# Joins texts for batch normalization, no normalization may touch it
+SEPARATOR = "\x00"
+
+
+class Profile:
+    """A set of normalizations compiled into a translation table"""
+    def __init__(self, name: str, diacritics: bool = True, tatweel: bool = True, alef: bool = True,
+                 ya: bool = True, ta_marbuta: bool = True, digits: bool = True, mapping: Dict[str, str] = None):
+        self.name = name
+        table = {}
+        if diacritics:
+            table.update({c: None for c in DIACRITICS})
+        if tatweel:
+            table[TATWEEL] = None
+        if alef:
+            table.update(ALEF)
+        if ya:
+            table.update(YA)
+        if ta_marbuta:
+            table.update(TA_MARBUTA)
+        if digits:
+            table.update(DIGITS)
+        if mapping:
+            table.update(mapping)
+        self.table = str.maketrans(table)
+
+    def normalize(self, text: str):
+        return text.translate(self.table)
+
+
+PROFILES = {
+    "light": Profile("light", alef=False, ya=False, ta_marbuta=False, digits=False),
+    "default": Profile("default"),
+}
+
+
+def get_profile(profile: Union[str, Profile]):
+    return PROFILES[profile] if isinstance(profile, str) else profile
+
+
+def register_profile(profile: Profile):
+    """Makes a profile available by name, e.g. to cache normalized text on lines"""
+    PROFILES[profile.name] = profile
+
+
+def normalize(text: str, profile: Union[str, Profile] = "default"):
+    return text.translate(get_profile(profile).table)
+
+
+def normalize_many(texts: Iterable[str], profile: Union[str, Profile] = "default") -> List[str]:
+    """Normalizes many texts at once, which is faster than normalizing them one by one"""
+    texts = list(texts)
+    table = get_profile(profile).table
+    normalized = SEPARATOR.join(texts).translate(table).split(SEPARATOR)
+    if len(normalized) != len(texts):
+        # Some text contains the separator
+        normalized = [text.translate(table) for text in texts]
+    return normalized
@@ -0,0 +1,142 @@
+"""An index of the open tags of a document by attribute, and tag counts that add up across documents.
+
+Automatic tags have a review code such as `fr` (`@RES@TYPE@Category@-@fr@`). A tag is reviewed when
+it has one that does not start with `0`.
+"""
+from array import array
+from collections import Counter
+from heapq import merge
+from .structures import Document, OpenTagAuto, OpenTagUser
+
+
+def is_reviewed(tag: OpenTagAuto):
+    return tag.review is not None and not tag.review.startswith("0")
+
+
+def unreviewed_category(tag: OpenTagAuto):
+    return None if is_reviewed(tag) else tag.category
+
+
+# Attributes derived from the other attributes of a tag
+DERIVED = {
+    "reviewed": is_reviewed,
+    "unreviewed_category": unreviewed_category,
+}
+# Indexed attributes of each kind of open tag
+FIELDS = {
+    OpenTagUser: ["user", "t_type", "t_subtype", "t_subsubtype"],
+    OpenTagAuto: ["resp", "t_type", "category", "review", "reviewed", "unreviewed_category"],
+}
+
+
+def attribute(tag, name: str):
+    return DERIVED[name](tag) if name in DERIVED else getattr(tag, name)
+
+
+class TagCounts:
+    """Numbers of open tags by kind (OpenTagUser or OpenTagAuto), attribute and value.
+
+    Counts of many documents can be merged, e.g. `sum((r.counts() for r in registries), TagCounts())`.
+    """
+    def __init__(self, counts: dict = None):
+        self.counts = Counter(counts or {})
+
+    def add(self, kind: str, name: str, value, n: int = 1):
+        self.counts[(kind, name, value)] += n
+
+    def merge(self, other: "TagCounts"):
+        self.counts.update(other.counts)
+        return self
+
+    def __add__(self, other: "TagCounts"):
+        return TagCounts(self.counts).merge(other)
+
+    def get(self, kind: str, name: str, value):
+        return self.counts.get((kind, name, value), 0)
+
+    def by(self, kind: str, name: str):
+        """Returns the number of tags of a kind by value of an attribute, e.g. `by("OpenTagAuto", "category")`"""
+        return {value: n for (k, a, value), n in self.counts.items() if k == kind and a == name}
+
+    def total(self, kind: str):
+        # The first attribute, the user or resp, is always set
+        first = next(names[0] for cls, names in FIELDS.items() if cls.__name__ == kind)
+        return sum(self.by(kind, first).values())
+
+
+class OpenTagRegistry:
+    """The open tags of a document, indexed by attribute. Rebuild it after changing the document."""
+    def __init__(self, document: Document):
+        self.document = document
+        self.tags = []
+        # Content and part positions of each tag
+        self.positions = array("l")
+        self.part_positions = array("l")
+        # Tag numbers by kind, and by kind, attribute and value
+        self.kinds = {cls: array("l") for cls in FIELDS}
+        self.index = {(cls, name): {} for cls, names in FIELDS.items() for name in names}
+
+        indexes = [zip(*positions) for cls, positions in document.type_index.items()
+                   if issubclass(cls, (OpenTagUser, OpenTagAuto))]
+        for pos, part_pos in merge(*indexes):
+            tag = document.content[pos].parts[part_pos]
+            n = len(self.tags)
+            self.tags.append(tag)
+            self.positions.append(pos)
+            self.part_positions.append(part_pos)
+            kind = OpenTagUser if isinstance(tag, OpenTagUser) else OpenTagAuto
+            self.kinds[kind].append(n)
+            for name in FIELDS[kind]:
+                values = self.index[(kind, name)]
+                value = attribute(tag, name)
+                if value not in values:
+                    values[value] = array("l")
+                values[value].append(n)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def numbers(self, cls: type, **filters):
+        """Returns the numbers of the tags of a kind matching all filters, in document order"""
+        if cls not in FIELDS:
+            raise ValueError(f"Not an open tag class: {cls}")
+        postings = [self.kinds[cls]]
+        for name, value in filters.items():
+            if (cls, name) not in self.index:
+                raise ValueError(f"{cls.__name__} has no indexed attribute {name}")
+            postings.append(self.index[(cls, name)].get(value, array("l")))
+        postings.sort(key=len)
+        if len(postings) == 1:
+            return postings[0]
+        others = [set(p) for p in postings[1:]]
+        return [n for n in postings[0] if all(n in other for other in others)]
+
+    def select(self, cls: type, context: bool = False, **filters):
+        """Iterates over the tags of a kind matching all filters in document order, e.g.
+        `select(OpenTagAuto, category="Category", reviewed=False)`. With `context`, yields (tag, line) tuples.
+        """
+        for n in self.numbers(cls, **filters):
+            if context:
+                yield self.tags[n], self.document.content[self.positions[n]]
+            else:
+                yield self.tags[n]
+
+    def unreviewed(self, category: str = None):
+        """The automatic tags that have not been reviewed, optionally of a single category"""
+        if category is None:
+            return list(self.select(OpenTagAuto, reviewed=False))
+        return list(self.select(OpenTagAuto, unreviewed_category=category))
+
+    def unreviewed_by_category(self):
+        """The automatic tags that have not been reviewed, by category"""
+        return {category: [self.tags[n] for n in numbers]
+                for category, numbers in self.index[(OpenTagAuto, "unreviewed_category")].items()
+                if category is not None}
+
+    def counts(self):
+        """Returns the number of tags by kind, attribute and value, see TagCounts"""
+        counts = TagCounts()
+        for (cls, name), values in self.index.items():
+            for value, numbers in values.items():
+                counts.add(cls.__name__, name, value, len(numbers))
+        return counts
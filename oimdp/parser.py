@@ -1,11 +1,20 @@
 import sys
 import re
-from .structures import Age, Date, Document, Hemistich, Hukm, Isnad, Matn, NamedEntity, OpenTagAuto, OpenTagUser, PageNumber, Paragraph, Line, RouteDist, RouteFrom, RouteTowa, Verse, Milestone
+from collections import deque
+from itertools import islice
+from typing import Iterable
+from .structures import Age, Date, Diagnostic, Document, Hemistich, Hukm, Isnad, Matn, NamedEntity, OpenTagAuto, OpenTagUser, PageNumber, Paragraph, Line, RouteDist, RouteFrom, RouteTowa, Verse, Milestone
 from .structures import SectionHeader, Editorial, Appendix, Paratext, DictionaryUnit, BioOrEvent
 from .structures import DoxographicalItem, MorphologicalPattern, TextPart
 from .structures import AdministrativeRegion, RouteOrDistance, Riwayat
+from .symbols import SYMBOLS
 from . import tags as t
 
+# Attribute values drawn from small vocabularies (types, users, categories, volumes, pages) are kept in
+# the shared symbol table. Tokens such as milestones and dates can take any value: they are interned
+# with sys.intern, which lets them be freed once no document refers to them.
+intern = SYMBOLS.intern
+
 PAGE_PATTERN = rf"{t.PAGE}[^P]+P\d+[AB]?"
 PAGE_PATTERN_GROUPED = rf"{t.PAGE}([^P]+)P(\d+[AB]?)"
 PAGE_RE = re.compile(PAGE_PATTERN_GROUPED)
@@ -20,11 +29,37 @@ OPEN_TAG_AUTO_PATTERN = r"@[A-Z]{3}@[A-Z]{3,}@[A-Za-z]+@(?:-@[0tf][ftalmr]@)?"
 OPEN_TAG_AUTO_PATTERN_GROUPED = re.compile(
     r"@([A-Z]{3})@([A-Z]{3,})@([A-Za-z]+)@(-@([0tf][ftalmr])@)?"
 )
+# Matches both kinds of open tags at once, custom tags first
+OPEN_TAG_RE = re.compile(
+    r"@(?:(?P<user>[^@]+?)@(?P<t_type>[^_@]+?)_(?P<t_subtype>[^_@]+?)(?:_(?P<t_subsubtype>[^_@]+?))?@"
+    r"|(?P<resp>[A-Z]{3})@(?P<auto_type>[A-Z]{3,})@(?P<category>[A-Za-z]+)@(?:-@(?P<review>[0tf][ftalmr])@)?)"
+)
 YEAR_PATTERN = [rf"{t.YEAR_AGE}\d{{1,4}}", rf"{t.YEAR_DEATH}\d{{1,4}}", rf"{t.YEAR_BIRTH}\d{{1,4}}", rf"{t.YEAR_OTHER}\d{{1,4}}"]
 TOP_PATTERN = [rf"{t.TOP_FULL}\d{{1,2}}", rf"{t.TOP}\d{{1,2}}"]
 PER_PATTERN = [rf"{t.PER_FULL}\d{{1,2}}", rf"{t.PER}\d{{1,2}}"]
 SOC_PATTERN = [rf"{t.SOC_FULL}\d{{1,2}}", rf"{t.SOC}\d{{1,2}}"]
 NAMED_ENTITIES_PATTERN = [*YEAR_PATTERN, *TOP_PATTERN, *PER_PATTERN, rf"{t.SRC}\d{{1,2}}", *SOC_PATTERN]
+WORD_RE = re.compile(r"\S+")
+# Named entity tags and types, in matching order
+NAMED_ENTITY_TAGS = [(t.SRC, "src"), (t.SOC_FULL, "soc"), (t.SOC, "soc"), (t.TOP_FULL, "top"), (t.TOP, "top"),
+                     (t.PER_FULL, "per"), (t.PER, "per")]
+
+# Compiled patterns are shared by all parses, compiled regular expressions are safe to use from several threads
+NAMED_ENTITIES_RES = [re.compile(tag) for tag in NAMED_ENTITIES_PATTERN]
+MILESTONE_RE = re.compile(MILESTONE_PATTERN)
+HEADER_RE = re.compile(HEADER_PATTERN_GROUPED)
+BIO_RE = re.compile(rf"{re.escape(t.BIO_MAN)}[^#]")
+PARA_RE = re.compile(r"^#($|[^#])")
+MORPHO_RE = re.compile(r"#~:([^:]+?):")
+REGION_RE = re.compile(
+    rf"({re.escape(t.PROV)}|{re.escape(t.REG)}\d) (.*?) {re.escape(t.GEO_TYPE)} (.*?) "
+    rf"({re.escape(t.REG)}\d|{re.escape(t.STTL)}) ([\w# ]+) $"
+)
+# Splits a line by tags. Make sure patterns do not include subgroups!
+TOKEN_RE = re.compile(
+    rf"({PAGE_PATTERN}|{MILESTONE_PATTERN}|{OPEN_TAG_AUTO_PATTERN}|{OPEN_TAG_CUSTOM_PATTERN}|"
+    rf"{'|'.join([re.escape(t) for t in t.PHRASE_LV_TAGS])}|{'|'.join([t for t in NAMED_ENTITIES_PATTERN])})"
+)
 
 
 def parse_tags(s: str):
@@ -35,8 +70,8 @@ def remove_phrase_lv_tags(s: str):
     text_only = s
     for tag in t.PHRASE_LV_TAGS:
         text_only = text_only.replace(tag, '')
-    for tag in NAMED_ENTITIES_PATTERN:
-        text_only = re.compile(tag).sub('', text_only)
+    for tag_re in NAMED_ENTITIES_RES:
+        text_only = tag_re.sub('', text_only)
     # Open tag
     text_only = OPEN_TAG_CUSTOM_PATTERN_GROUPED.sub('', text_only)
     text_only = OPEN_TAG_AUTO_PATTERN_GROUPED.sub('', text_only)
@@ -44,8 +79,78 @@ def remove_phrase_lv_tags(s: str):
     return text_only
 
 
-def parse_line(tagged_il: str, index: int, obj=Line, first_token=None):
-    """ parse a line text into LineParts by splitting it by tags and patterns """
+def parse_header(il: str):
+    """Returns the text without tags and the level of a section header line"""
+    value = HEADER_RE.sub('', il)
+    # remove other phrase level tags
+    value = remove_phrase_lv_tags(value)
+    return value, len(HEADER_RE.match(il).group(1))
+
+
+def is_bio_or_event(il: str):
+    return bool(BIO_RE.search(il)) or il.startswith(t.BIO) or il.startswith(t.EVENT)
+
+
+def dictionary_unit(il: str):
+    """Returns the rest of a dictionary unit line and the dictionary type"""
+    no_tag = il
+    for tag in t.DICTIONARIES:
+        no_tag = no_tag.replace(tag, '')
+    dic_type = "bib"
+    if (t.DIC_LEX in il):
+        dic_type = "lex"
+    elif (t.DIC_NIS in il):
+        dic_type = "nis"
+    elif (t.DIC_TOP in il):
+        dic_type = "top"
+    return no_tag, dic_type
+
+
+def bio_or_event(il: str):
+    """Returns the rest of a biography or event line and its type"""
+    no_tag = il
+    for tag in t.BIOS_EVENTS:
+        no_tag = no_tag.replace(tag, '')
+    be_type = "man"
+    # Ordered from longer to shorter string to aid matching. I.e. ### $$$ before ### $$
+    if (t.LIST_NAMES_FULL in il or t.LIST_NAMES in il):
+        be_type = "names"
+    elif (t.BIO_REF_FULL in il or t.BIO_REF in il):
+        be_type = "ref"
+    elif (t.BIO_WOM_FULL in il or t.BIO_WOM in il):
+        be_type = "wom"
+    elif (t.LIST_EVENTS in il):
+        be_type = "events"
+    elif (t.EVENT in il):
+        be_type = "event"
+    return no_tag, be_type
+
+
+def named_entity_tag(token: str):
+    """Returns the named entity tag in a token and the named entity type, if any"""
+    for tag, ne_type in NAMED_ENTITY_TAGS:
+        if tag in token:
+            return tag, ne_type
+    return None
+
+
+def report_error(on_error, kind: str, tag: str, token: str, column: int, message: str):
+    """Reports a token that could not be parsed to `on_error`, or raises without one.
+
+    The reported text is the word of the token with the tag.
+    """
+    if on_error is None:
+        raise Exception(message)
+    m = re.search(rf"\S*{re.escape(tag)}\S*", token)
+    on_error(kind, m.group(), column + m.start(), message)
+
+
+def parse_line(tagged_il: str, index: int, obj=Line, first_token=None, on_error=None):
+    """ parse a line text into LineParts by splitting it by tags and patterns
+
+    Without `on_error`, raises on tokens that cannot be parsed. Otherwise they are kept as
+    TextPart and `on_error(kind, token, column, message)` is called.
+    """
     # remove line tag
     il = tagged_il.replace(t.LINE, '')
 
@@ -58,8 +163,8 @@ def parse_line(tagged_il: str, index: int, obj=Line, first_token=None):
 
     line = obj(il, text_only)
 
-    # Split the line by tags. Make sure patterns do not include subgroups!
-    tokens = re.split(rf"({PAGE_PATTERN}|{MILESTONE_PATTERN}|{OPEN_TAG_AUTO_PATTERN}|{OPEN_TAG_CUSTOM_PATTERN}|{'|'.join([re.escape(t) for t in t.PHRASE_LV_TAGS])}|{'|'.join([t for t in NAMED_ENTITIES_PATTERN])})", il)
+    # Split the line by tags
+    tokens = TOKEN_RE.split(il)
 
     # Some structures inject a token at the beginning of a line, like a riwāyaŧ's isnād
     if first_token:
@@ -69,264 +174,300 @@ def parse_line(tagged_il: str, index: int, obj=Line, first_token=None):
     # This variable is used to keep track. A "word" is just a space-separated token.
     include_words = 0
 
+    # Position of the token in the line
+    column = end = 0
     for token in tokens:
+        column, end = end, end + len(token)
         if token == '':
             continue
 
-        opentag_match = None
-        opentagauto_match = None
+        open_tag = OPEN_TAG_RE.match(token) if token.startswith('@') else None
 
-        if token.startswith('@'):
-            opentag_match = OPEN_TAG_CUSTOM_PATTERN_GROUPED.match(token)
-            opentagauto_match = OPEN_TAG_AUTO_PATTERN_GROUPED.match(token)
+        # Tokens that could not be parsed are kept as text
+        is_text = False
 
         if t.PAGE in token:
             m = PAGE_RE.search(token)
             try:
-                line.add_part(PageNumber(token, m.group(1), m.group(2)))
+                line.add_part(PageNumber(token, intern(m.group(1)), intern(m.group(2))))
             except Exception:
-                raise Exception(
-                    'Could not parse page number at line: ' + str(index+1)
-                )
-        elif re.compile(MILESTONE_PATTERN).match(token):
-            line.add_part(Milestone(token))
-        elif opentag_match:
-            line.add_part(OpenTagUser(token, 
-                opentag_match.group(1),  # user
-                opentag_match.group(2),  # t_type
-                opentag_match.group(3),  # t_subtype
-                opentag_match.group(5))) # t_subsubtype
-        elif opentagauto_match:
-            line.add_part(OpenTagAuto(token, 
-                opentagauto_match.group(1),  # resp
-                opentagauto_match.group(2),  # t_type                
-                opentagauto_match.group(3),  # category
-                opentagauto_match.group(5))) # review
+                report_error(on_error, "PageNumber", t.PAGE, token, column,
+                             'Could not parse page number at line: ' + str(index+1))
+                is_text = True
+        elif MILESTONE_RE.match(token):
+            line.add_part(Milestone(sys.intern(token)))
+        elif open_tag and open_tag.group("user") is not None:
+            line.add_part(OpenTagUser(sys.intern(token),
+                intern(open_tag.group("user")),
+                intern(open_tag.group("t_type")),
+                intern(open_tag.group("t_subtype")),
+                intern(open_tag.group("t_subsubtype"))))
+        elif open_tag:
+            line.add_part(OpenTagAuto(sys.intern(token),
+                intern(open_tag.group("resp")),
+                intern(open_tag.group("auto_type")),
+                intern(open_tag.group("category")),
+                intern(open_tag.group("review"))))
         elif t.HEMI in token:
-            line.add_part(Hemistich(token))
+            line.add_part(Hemistich(sys.intern(token)))
         elif t.MATN in token:
-            line.add_part(Matn(token))
+            line.add_part(Matn(sys.intern(token)))
         elif t.HUKM in token:
-            line.add_part(Hukm(token))
+            line.add_part(Hukm(sys.intern(token)))
         elif t.ROUTE_FROM in token:
-            line.add_part(RouteFrom(token))
+            line.add_part(RouteFrom(sys.intern(token)))
         elif t.ROUTE_TOWA in token:
-            line.add_part(RouteTowa(token))
+            line.add_part(RouteTowa(sys.intern(token)))
         elif t.ROUTE_DIST in token:
-            line.add_part(RouteDist(token))
+            line.add_part(RouteDist(sys.intern(token)))
         elif t.YEAR_BIRTH in token:
-            line.add_part(Date(token, token.replace(t.YEAR_BIRTH, ''), 'birth'))
+            line.add_part(Date(sys.intern(token), sys.intern(token.replace(t.YEAR_BIRTH, '')), 'birth'))
         elif t.YEAR_DEATH in token:
-            line.add_part(Date(token, token.replace(t.YEAR_DEATH, ''), 'death'))
+            line.add_part(Date(sys.intern(token), sys.intern(token.replace(t.YEAR_DEATH, '')), 'death'))
         elif t.YEAR_OTHER in token:
-            line.add_part(Date(token, token.replace(t.YEAR_OTHER, ''), 'other'))
+            line.add_part(Date(sys.intern(token), sys.intern(token.replace(t.YEAR_OTHER, '')), 'other'))
         elif t.YEAR_AGE in token:
-            line.add_part(Age(token, token.replace(t.YEAR_AGE, '')))
-        elif t.SRC in token:
-            val = token.replace(t.SRC, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'src'))
-        elif t.SOC_FULL in token:
-            val = token.replace(t.SOC_FULL, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'soc'))
-        elif t.SOC in token in token:
-            val = token.replace(t.SOC, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'soc'))
-        elif t.TOP_FULL in token:
-            val = token.replace(t.TOP_FULL, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'top'))
-        elif t.TOP in token:
-            val = token.replace(t.TOP, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'top'))
-        elif t.PER_FULL in token:
-            val = token.replace(t.PER_FULL, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'per'))
-        elif t.PER in token:
-            val = token.replace(t.PER, '')
-            include_words = int(val[1])
-            line.add_part(NamedEntity(token, int(val[0]), include_words, "", 'per'))
+            line.add_part(Age(sys.intern(token), sys.intern(token.replace(t.YEAR_AGE, ''))))
+        elif (ne_tag := named_entity_tag(token)):
+            tag, ne_type = ne_tag
+            val = token.replace(tag, '')
+            try:
+                prefix, include = int(val[0]), int(val[1])
+                line.add_part(NamedEntity(sys.intern(token), prefix, include, "", ne_type))
+                include_words = include
+            except (ValueError, IndexError):
+                report_error(on_error, "NamedEntity", tag, token, column,
+                             'Could not parse named entity at line: ' + str(index+1))
+                is_text = True
         else:
+            is_text = True
+
+        if is_text:
             if include_words > 0:
                 rest = ""
-                words = token.strip().split()
+                words = list(WORD_RE.finditer(token))
                 for pos, word in enumerate(words):
                     if (pos < include_words):
-                        line.parts[-1].text = line.parts[-1].text + word + " "
+                        line.parts[-1].text = line.parts[-1].text + word.group() + " "
                     else:
-                        rest = rest + word + " "
+                        rest = rest + word.group() + " "
+                # Keep the exact source of the split so the line can be written back
+                cut = words[include_words - 1].end() if len(rest) else len(token)
+                line.parts[-1].text_orig = token[:cut]
                 if len(rest):
-                    line.add_part(TextPart(rest))
+                    rest_part = TextPart(token[cut:])
+                    rest_part.text = rest
+                    line.add_part(rest_part)
                 include_words = 0
             else:
                 line.add_part(TextPart(token))
     return line
 
 
-def parser(text: str, strict: bool = False):
-    """Parses an OpenITI mARkdown file and returns a Document object"""
-    document = Document(text)
-
-    # Split input text into lines
-    ilines = text.splitlines()
-
-    # Magic value
-    magic_value = ilines[0]
-    
-    if strict and magic_value.strip() != "######OpenITI#":
-        raise Exception(
-            "This does not appear to be an OpenITI mARkdown document (strict mode)")
-        sys.exit(1)
-    elif not magic_value.strip().encode('ascii', 'ignore').decode('ascii').startswith("######OpenITI#"):
-        raise Exception(
-            "This does not appear to be an OpenITI mARkdown document")
-        sys.exit(1)
-
-    document.set_magic_value(magic_value)
-
-    # RE patterns
-    para_pattern = re.compile(r"^#($|[^#])")    
-    bio_pattern = re.compile(rf"{re.escape(t.BIO_MAN)}[^#]")
-    morpho_pattern = re.compile(r"#~:([^:]+?):")
-    region_pattern = re.compile(
-        rf"({t.PROV}|{t.REG}\d) .*? {t.GEO_TYPE} .*? ({t.REG}\d|{t.STTL}) ([\w# ]+) $"
-    )
-
-    # Input lines loop
-    for i, il in enumerate(ilines):
-        
-        # N.B. the order of if statements matters!
-        # We're doing string matching and tag elements are re-used.
-
-        # Non-machine readable metadata
-        if (il.startswith(t.META)):
-            if (il.strip() == t.METAEND):
-                continue
-            value = il.split(t.META, 1)[1].strip()
-            document.set_simple_metadata_field(il, value)
-
-        # Content-level page numbers
-        elif (il.startswith(t.PAGE)):
-            pv = PAGE_RE.search(il)
-            try:
-                document.add_content(PageNumber(il, pv.group(1), pv.group(2)))
-            except Exception:
-                raise Exception(
-                    'Could not parse page number at line: ' + str(i+1)
-                )
-
-        # Riwāyāt units
-        elif (il.startswith(t.RWY)):
-            # Set first line, skipping para marker "# $RWY$"
-            document.add_content(Riwayat())
-            first_line = parse_line(il[7:], i, first_token=Isnad)
-            if first_line:
-                document.add_content(first_line)
-
-        # Routes
-        elif (il.startswith(t.ROUTE_FROM)):
-            document.add_content(parse_line(il, i, RouteOrDistance))
-
-        # Morphological pattern
-        elif (morpho_pattern.search(il)):
-            m = morpho_pattern.search(il)
-            document.add_content(MorphologicalPattern(il, m.group(1)))
-
-        # Paragraphs and lines of verse
-        elif (para_pattern.search(il)):
-            if (t.HEMI in il):
-                # this is a verse line, skip para marker "#"
-                document.add_content(parse_line(il[1:], i, Verse))
-            else:
-                document.add_content(Paragraph())
-                first_line = parse_line(il[1:], i)
+class Parser:
+    """A reusable OpenITI mARkdown parser.
+
+    With `errors="collect"`, structures that cannot be parsed do not raise an exception: they are kept
+    as text and described in `Document.diagnostics`.
+
+    Parser objects are immutable and hold no state between parses, so a single one can be shared by
+    many threads, including on free-threaded Python builds. The compiled patterns are module constants
+    and strings are interned in the thread-safe SYMBOLS table.
+    """
+    __slots__ = ("strict", "errors")
+
+    def __init__(self, strict: bool = False, errors: str = "raise"):
+        if errors not in ("raise", "collect"):
+            raise ValueError(f"Unknown errors mode: {errors}")
+        object.__setattr__(self, "strict", strict)
+        object.__setattr__(self, "errors", errors)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Parser objects are immutable")
+
+    def parse(self, text: str, on_diagnostic=None):
+        """Parses an OpenITI mARkdown file and returns a Document object
+
+        `on_diagnostic` is called with each Diagnostic as it is found, see `errors`.
+        """
+        document = Document(text)
+
+        # Split input text into lines
+        ilines = text.splitlines()
+
+        # Magic value
+        magic_value = ilines[0]
+
+        if self.strict and magic_value.strip() != "######OpenITI#":
+            raise Exception(
+                "This does not appear to be an OpenITI mARkdown document (strict mode)")
+            sys.exit(1)
+        elif not magic_value.strip().encode('ascii', 'ignore').decode('ascii').startswith("######OpenITI#"):
+            raise Exception(
+                "This does not appear to be an OpenITI mARkdown document")
+            sys.exit(1)
+
+        document.set_magic_value(magic_value)
+
+        def report(kind: str, token: str, column: int, message: str):
+            # The column of the token in the line being parsed, which can be shorter than the input line
+            found = il.find(token, column)
+            diagnostic = Diagnostic(i, found if found >= 0 else column, token, kind, message)
+            document.add_diagnostic(diagnostic)
+            if on_diagnostic is not None:
+                on_diagnostic(diagnostic)
+
+        on_error = report if self.errors == "collect" else None
+
+        def add_line(line, il: str, i: int):
+            # Lines without text are kept as None, their source is recorded separately
+            if line is None:
+                document.add_unparsed_line(il, i)
+            document.add_content(line, i)
+
+        # Input lines loop, the magic value line is already handled
+        for i, il in islice(enumerate(ilines), 1, None):
+
+            # N.B. the order of if statements matters!
+            # We're doing string matching and tag elements are re-used.
+
+            # Non-machine readable metadata
+            if (il.startswith(t.META)):
+                if (il.strip() == t.METAEND):
+                    document.add_unparsed_line(il, i)
+                    continue
+                value = il.split(t.META, 1)[1].strip()
+                document.set_simple_metadata_field(il, value, i)
+
+            # Content-level page numbers
+            elif (il.startswith(t.PAGE)):
+                pv = PAGE_RE.search(il)
+                try:
+                    document.add_content(PageNumber(il, intern(pv.group(1)), intern(pv.group(2))), i)
+                except Exception:
+                    if on_error is None:
+                        raise Exception(
+                            'Could not parse page number at line: ' + str(i+1)
+                        )
+                    on_error("PageNumber", il, 0, 'Could not parse page number at line: ' + str(i+1))
+                    document.add_unparsed_line(il, i)
+
+            # Riwāyāt units
+            elif (il.startswith(t.RWY)):
+                # Set first line, skipping para marker "# $RWY$"
+                document.add_content(Riwayat(), i)
+                first_line = parse_line(il[7:], i, first_token=Isnad, on_error=on_error)
+                if first_line:
+                    document.add_content(first_line, i)
+
+            # Routes
+            elif (il.startswith(t.ROUTE_FROM)):
+                add_line(parse_line(il, i, RouteOrDistance, on_error=on_error), il, i)
+
+            # Regions, before paragraphs as their tags start with "#"
+            elif (REGION_RE.search(il)):
+                m = REGION_RE.search(il)
+                document.add_content(AdministrativeRegion(il,
+                    intern(m.group(1).lstrip("#$").lower()),  # division: prov, reg1, ...
+                    m.group(2).strip(),  # name
+                    intern(m.group(3).strip()),  # region_type
+                    intern(m.group(4).lstrip("#$").lower()),  # subdivision: reg2, sttl, ...
+                    [n.strip() for n in m.group(5).split("#") if n.strip()]), i)
+
+            # Morphological pattern
+            elif (MORPHO_RE.search(il)):
+                m = MORPHO_RE.search(il)
+                document.add_content(MorphologicalPattern(il, intern(m.group(1))), i)
+
+            # Paragraphs and lines of verse
+            elif (PARA_RE.search(il)):
+                if (t.HEMI in il):
+                    # this is a verse line, skip para marker "#"
+                    add_line(parse_line(il[1:], i, Verse, on_error=on_error), il, i)
+                else:
+                    document.add_content(Paragraph(), i)
+                    first_line = parse_line(il[1:], i, on_error=on_error)
+                    if first_line:
+                        document.add_content(first_line, i)
+
+            # Lines
+            elif (il.startswith(t.LINE)):
+                add_line(parse_line(il, i, on_error=on_error), il, i)
+
+            # Sections
+            elif (il.startswith(t.EDITORIAL)):
+                document.add_content(Editorial(il), i)
+            elif (il.startswith(t.APPENDIX)):
+                document.add_content(Appendix(il), i)
+            elif (il.startswith(t.PARATEXT)):
+                document.add_content(Paratext(il), i)
+
+            # Section headers
+            elif (il.startswith(t.HEADER)):
+                value, level = parse_header(il)
+                document.add_content(SectionHeader(il, value, level), i)
+
+            # Dictionary entry
+            elif (il.startswith(t.DIC)):
+                no_tag, dic_type = dictionary_unit(il)
+                first_line = parse_line(no_tag, i, on_error=on_error)
+                document.add_content(DictionaryUnit(il, dic_type), i)
                 if first_line:
-                    document.add_content(first_line)
-
-        # Lines
-        elif (il.startswith(t.LINE)):
-            document.add_content(parse_line(il, i))
-
-        # Sections
-        elif (il.startswith(t.EDITORIAL)):
-            document.add_content(Editorial(il))
-        elif (il.startswith(t.APPENDIX)):
-            document.add_content(Appendix(il))
-        elif (il.startswith(t.PARATEXT)):
-            document.add_content(Paratext(il))
-
-        # Section headers
-        elif (il.startswith(t.HEADER)):
-            value = il
-            header_re = re.compile(HEADER_PATTERN_GROUPED)
-            value = header_re.sub('', value)
-            # remove other phrase level tags
-            value = remove_phrase_lv_tags(value)
-            level = len(header_re.match(il).group(1))
-
-            document.add_content(SectionHeader(il, value, level))
-
-        # Dictionary entry
-        elif (il.startswith(t.DIC)):
-            no_tag = il
-            for tag in t.DICTIONARIES:
-                no_tag = no_tag.replace(tag, '')
-            first_line = parse_line(no_tag, i)
-            dic_type = "bib"
-            if (t.DIC_LEX in il):
-                dic_type = "lex"
-            elif (t.DIC_NIS in il):
-                dic_type = "nis"
-            elif (t.DIC_TOP in il):
-                dic_type = "top"
-            document.add_content(DictionaryUnit(il, dic_type))
-            if first_line:
-                document.add_content(first_line)
-
-        # Doxographical item
-        elif (il.startswith(t.DOX)):
-            no_tag = il
-            for tag in t.DOXOGRAPHICAL:
-                no_tag = no_tag.replace(tag, '')
-            first_line = parse_line(no_tag, i)
-            dox_type = "pos"
-            if (t.DOX_SEC in il):
-                dox_type = "sec"
-            document.add_content(DoxographicalItem(il, dox_type))
-            if first_line:
-                document.add_content(first_line)
-
-        # Biographies and Events
-        elif (bio_pattern.search(il) or il.startswith(t.BIO) or il.startswith(t.EVENT)):
-            no_tag = il
-            for tag in t.BIOS_EVENTS:
-                no_tag = no_tag.replace(tag, '')
-            first_line = parse_line(no_tag, i)
-            be_type = "man"
-            # Ordered from longer to shorter string to aid matching. I.e. ### $$$ before ### $$
-            if (t.LIST_NAMES_FULL in il or t.LIST_NAMES in il):
-                be_type = "names"
-            elif (t.BIO_REF_FULL in il or t.BIO_REF in il):
-                be_type = "ref"
-            elif (t.BIO_WOM_FULL in il or t.BIO_WOM in il):
-                be_type = "wom"
-            elif (t.LIST_EVENTS in il):
-                be_type = "events"
-            elif (t.EVENT in il):
-                be_type = "event"
-            document.add_content(BioOrEvent(il, be_type))
-            if first_line:
-                document.add_content(first_line)
-
-        # Regions
-        elif (region_pattern.search(il)):
-            document.add_content(AdministrativeRegion(il))
+                    document.add_content(first_line, i)
+
+            # Doxographical item
+            elif (il.startswith(t.DOX)):
+                no_tag = il
+                for tag in t.DOXOGRAPHICAL:
+                    no_tag = no_tag.replace(tag, '')
+                first_line = parse_line(no_tag, i, on_error=on_error)
+                dox_type = "pos"
+                if (t.DOX_SEC in il):
+                    dox_type = "sec"
+                document.add_content(DoxographicalItem(il, dox_type), i)
+                if first_line:
+                    document.add_content(first_line, i)
 
-        else:
-            continue
+            # Biographies and Events
+            elif (is_bio_or_event(il)):
+                no_tag, be_type = bio_or_event(il)
+                first_line = parse_line(no_tag, i, on_error=on_error)
+                document.add_content(BioOrEvent(il, be_type), i)
+                if first_line:
+                    document.add_content(first_line, i)
+
+            else:
+                document.add_unparsed_line(il, i)
+
+        return document
+
+    def parse_many(self, texts: Iterable[str], threads: int = None):
+        """Parses many texts and returns an iterator over their Documents, in order.
 
-    return document
+        With `threads`, texts are parsed by a pool of threads sharing this parser. Texts are read as needed,
+        at most `2 * threads` ahead of the Document returned.
+        """
+        if not threads or threads <= 1:
+            return map(self.parse, texts)
+        return self.parse_threaded(texts, threads)
+
+    def parse_threaded(self, texts: Iterable[str], threads: int):
+        from concurrent.futures import ThreadPoolExecutor
+        texts = iter(texts)
+        with ThreadPoolExecutor(threads) as pool:
+            pending = deque(pool.submit(self.parse, text) for text in islice(texts, 2 * threads))
+            try:
+                while pending:
+                    document = pending.popleft().result()
+                    # One more text for each Document returned, so that the threads keep busy meanwhile
+                    for text in islice(texts, 1):
+                        pending.append(pool.submit(self.parse, text))
+                    yield document
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+def parser(text: str, strict: bool = False, errors: str = "raise", on_diagnostic=None):
+    """Parses an OpenITI mARkdown file and returns a Document object, see Parser"""
+    return Parser(strict, errors).parse(text, on_diagnostic)
@@ -0,0 +1,168 @@
+"""Text reuse detection between milestone blocks with MinHash and locality-sensitive hashing.
+
+Milestones split texts in blocks of about 300 words. Each block's clean text is shingled into word n-grams,
+summarized by a MinHash signature, and added to an LSHIndex under a key such as (document id, block number).
+Indexes built by separate processes can be saved, loaded and merged before looking for candidate pairs.
+
+Signatures are computed with numpy for many blocks at once when it is installed, and in pure Python otherwise.
+Both give the same signatures.
+"""
+import pickle
+import random
+import zlib
+from array import array
+from itertools import combinations
+from typing import Iterable, Tuple
+from .structures import Document, Line, Milestone, NamedEntity, TextPart
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+# Number of shingles hashed at once with numpy, bounds memory to about 8 bytes * permutations * BATCH_SHINGLES
+BATCH_SHINGLES = 50000
+
+
+def milestone_blocks(document: Document):
+    """Iterates over the (block number, clean text) of the milestone blocks of a document"""
+    words = []
+    block = 0
+    for line in document.select(Line):
+        for part in line.parts:
+            if isinstance(part, Milestone):
+                yield block, " ".join(words)
+                words = []
+                block += 1
+            elif isinstance(part, (TextPart, NamedEntity)):
+                words.append(part.text)
+    if words:
+        yield block, " ".join(words)
+
+
+class MinHasher:
+    """Computes MinHash signatures of word shingles"""
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rand = random.Random(seed)
+        # a * hash + b must fit in 64 bits for numpy
+        self.a = [rand.randrange(1, 1 << 31) for _ in range(num_perm)]
+        self.b = [rand.randrange(0, 1 << 32) for _ in range(num_perm)]
+
+    def shingles(self, text: str):
+        """Gets the sorted, unique hashes of the word shingles of a text"""
+        words = text.split()
+        n = self.shingle_size
+        grams = [" ".join(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))] if words else []
+        return array("I", sorted({zlib.crc32(g.encode("utf-8")) for g in grams}))
+
+    def signature(self, hashes: array):
+        if not hashes:
+            return array("I", [MAX_HASH]) * self.num_perm
+        return array("I", [
+            min([((a * x + b) % MERSENNE_PRIME) & MAX_HASH for x in hashes])
+            for a, b in zip(self.a, self.b)
+        ])
+
+    def signatures(self, texts: Iterable[str]):
+        """Gets the signatures of many texts, in order"""
+        all_hashes = [self.shingles(text) for text in texts]
+        if np is None:
+            return [self.signature(hashes) for hashes in all_hashes]
+
+        signatures = [None] * len(all_hashes)
+        a = np.array(self.a, dtype=np.uint64)[:, None]
+        b = np.array(self.b, dtype=np.uint64)[:, None]
+        batch, size = [], 0
+        for i, hashes in enumerate(all_hashes + [None]):
+            if hashes is not None and not hashes:
+                signatures[i] = self.signature(hashes)
+                continue
+            if batch and (hashes is None or size + len(hashes) > BATCH_SHINGLES):
+                # One row per permutation, one column per shingle, reduced to one column per text
+                x = np.concatenate([np.frombuffer(h, dtype=np.uint32) for _, h in batch]).astype(np.uint64)
+                starts = np.cumsum([0] + [len(h) for _, h in batch[:-1]])
+                hashed = ((a * x[None, :] + b) % np.uint64(MERSENNE_PRIME)) & np.uint64(MAX_HASH)
+                mins = np.minimum.reduceat(hashed, starts, axis=1).astype(np.uint32).T.copy()
+                for (j, _), row in zip(batch, mins):
+                    signatures[j] = array("I", row.tobytes())
+                batch, size = [], 0
+            if hashes is not None:
+                batch.append((i, hashes))
+                size += len(hashes)
+        return signatures
+
+
+class LSHIndex:
+    """A locality-sensitive hashing index of MinHash signatures, split in bands"""
+    def __init__(self, num_perm: int = 128, bands: int = 32):
+        if num_perm % bands:
+            raise ValueError("The number of permutations must be a multiple of the number of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = {}
+
+    def add(self, key, signature: array):
+        self.signatures[key] = signature
+        for band, buckets in enumerate(self.buckets):
+            band_key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            buckets.setdefault(band_key, []).append(key)
+
+    def merge(self, other: "LSHIndex"):
+        """Adds the signatures of another index, e.g. one built by another worker process"""
+        if (other.num_perm, other.bands) != (self.num_perm, self.bands):
+            raise ValueError("Cannot merge indexes with different numbers of permutations or bands")
+        self.signatures.update(other.signatures)
+        for buckets, other_buckets in zip(self.buckets, other.buckets):
+            for band_key, keys in other_buckets.items():
+                buckets.setdefault(band_key, []).extend(keys)
+
+    def similarity(self, key_a, key_b):
+        """Estimates the Jaccard similarity of the shingles of two blocks"""
+        a = self.signatures[key_a]
+        b = self.signatures[key_b]
+        return sum([x == y for x, y in zip(a, b)]) / self.num_perm
+
+    def candidates(self, threshold: float = 0.0, same_document: bool = False, max_bucket: int = None):
+        """Iterates over candidate pairs of reused blocks as (key, key, estimated similarity).
+
+        Keys are expected to be (document id, block number) tuples: pairs from the same document are skipped
+        unless `same_document` is set. Buckets with more than `max_bucket` keys, usually boilerplate, are skipped.
+        """
+        seen = set()
+        for buckets in self.buckets:
+            for keys in buckets.values():
+                if len(keys) < 2 or (max_bucket and len(keys) > max_bucket):
+                    continue
+                for pair in combinations(keys, 2):
+                    if frozenset(pair) in seen or (not same_document and pair[0][0] == pair[1][0]):
+                        continue
+                    seen.add(frozenset(pair))
+                    similarity = self.similarity(*pair)
+                    if similarity >= threshold:
+                        yield pair[0], pair[1], similarity
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def index_documents(documents: Iterable[Tuple[str, Document]], hasher: MinHasher = None, index: LSHIndex = None):
+    """Adds the milestone blocks of (document id, Document) pairs to an index and returns it"""
+    hasher = hasher or MinHasher()
+    index = index or LSHIndex(hasher.num_perm)
+    for doc_id, document in documents:
+        blocks = list(milestone_blocks(document))
+        for (block, _), signature in zip(blocks, hasher.signatures([text for _, text in blocks])):
+            index.add((doc_id, block), signature)
+    return index
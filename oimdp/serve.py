@@ -0,0 +1,202 @@
+"""A pre-forked pool of warm parser processes listening on a Unix socket.
+
+The protocol is newline-delimited JSON. Each request is an object on its own line and gets
+a response on its own line, in order. Clients can send several requests without waiting
+for responses (pipelining).
+
+Requests:
+
+- `{"id": 1, "path": "/path/to/file"}`: parse a file
+- `{"id": 2, "text": "######OpenITI#..."}`: parse text
+- `{"id": 3, "op": "health"}`: check the server is up
+- `{"id": 4, "op": "metrics"}`: request counts and latencies, summed over all workers
+
+`id` is optional and is echoed in the response. Parse requests also accept `"strict": true`,
+`"errors": "collect"` to get diagnostics instead of an error for malformed structures, and
+`"profiles": ["default"]` to include normalized text in lines, see `oimdp.normalize`.
+Responses have `"ok": true` and a `document` (see `oimdp.export.to_dict`), or `"ok": false`
+and an `error` message.
+"""
+import json
+import os
+import signal
+import socket
+import stat
+import time
+from multiprocessing.sharedctypes import RawArray
+from .export import to_dict
+from .parser import parser
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. The last bucket is unbounded.
+LATENCY_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+# Per-worker counters in shared memory: requests, errors, total and max latency, histogram
+REQUESTS, ERRORS, TOTAL_MS, MAX_MS, HISTOGRAM = range(5)
+STATS_SIZE = HISTOGRAM + len(LATENCY_BUCKETS) + 1
+
+
+def handle_request(request: dict):
+    """Runs a single request and returns its response"""
+    op = request.get("op", "parse")
+    if op == "parse":
+        if "path" in request:
+            with open(request["path"], "r", encoding="utf-8") as f:
+                text = f.read()
+        elif "text" in request:
+            text = request["text"]
+        else:
+            raise ValueError("A parse request needs a path or a text")
+        document = parser(text, request.get("strict", False), request.get("errors", "raise"))
+        return {"document": to_dict(document, request.get("profiles", ()))}
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def metrics(stats, workers: int, started: float):
+    requests = errors = total_ms = max_ms = 0
+    histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+    for slot in range(workers):
+        base = slot * STATS_SIZE
+        requests += int(stats[base + REQUESTS])
+        errors += int(stats[base + ERRORS])
+        total_ms += stats[base + TOTAL_MS]
+        max_ms = max(max_ms, stats[base + MAX_MS])
+        for b in range(len(histogram)):
+            histogram[b] += int(stats[base + HISTOGRAM + b])
+    return {
+        "workers": workers,
+        "uptime": time.time() - started,
+        "requests": requests,
+        "errors": errors,
+        "mean_ms": total_ms / requests if requests else 0,
+        "max_ms": max_ms,
+        "latency_buckets_ms": LATENCY_BUCKETS,
+        "histogram": histogram,
+    }
+
+
+def record(stats, slot: int, elapsed_ms: float, error: bool):
+    base = slot * STATS_SIZE
+    stats[base + REQUESTS] += 1
+    if error:
+        stats[base + ERRORS] += 1
+    stats[base + TOTAL_MS] += elapsed_ms
+    stats[base + MAX_MS] = max(stats[base + MAX_MS], elapsed_ms)
+    bucket = next((b for b, limit in enumerate(LATENCY_BUCKETS) if elapsed_ms <= limit), len(LATENCY_BUCKETS))
+    stats[base + HISTOGRAM + bucket] += 1
+
+
+def handle_connection(conn: socket.socket, slot: int, stats, workers: int, started: float):
+    with conn, conn.makefile("rb") as rfile, conn.makefile("wb") as wfile:
+        for raw in rfile:
+            if not raw.strip():
+                continue
+            start = time.perf_counter()
+            response = {}
+            try:
+                request = json.loads(raw)
+                response["id"] = request.get("id")
+                op = request.get("op")
+                if op == "health":
+                    response.update(ok=True, pid=os.getpid(), worker=slot)
+                elif op == "metrics":
+                    response.update(ok=True, metrics=metrics(stats, workers, started))
+                else:
+                    response.update(handle_request(request), ok=True)
+            except Exception as e:
+                response.update(ok=False, error=str(e))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            response["elapsed_ms"] = elapsed_ms
+            record(stats, slot, elapsed_ms, not response["ok"])
+            wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+            wfile.flush()
+
+
+def worker(sock: socket.socket, slot: int, stats, workers: int, started: float):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    while True:
+        conn, _ = sock.accept()
+        try:
+            handle_connection(conn, slot, stats, workers, started)
+        except OSError:
+            # The client went away
+            continue
+
+
+def socket_identity(st: os.stat_result):
+    # Inode numbers can be reused, the change time tells apart sockets bound one after the other
+    return st.st_dev, st.st_ino, st.st_ctime_ns
+
+
+def remove_socket(path: str, identity: tuple = None):
+    """Deletes the Unix socket at `path`, if there is one.
+
+    Raises FileExistsError if something else is there. With `identity` (see socket_identity), only
+    deletes that socket.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError(f"Not a socket, will not replace it: {path}")
+    if identity is None or socket_identity(st) == identity:
+        os.unlink(path)
+
+
+def serve(path: str, workers: int = None):
+    """Listens on a Unix socket at `path` with a pool of forked parser processes.
+
+    Blocks until the server receives SIGTERM or SIGINT.
+    """
+    workers = workers or os.cpu_count() or 1
+    remove_socket(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen(128)
+    # The socket may be replaced by another server while this one runs
+    identity = socket_identity(os.stat(path))
+
+    stats = RawArray("d", workers * STATS_SIZE)
+    started = time.time()
+    pids = {}
+
+    def spawn(slot: int):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker(sock, slot, stats, workers, started)
+            finally:
+                os._exit(0)
+        pids[pid] = slot
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for slot in range(workers):
+        spawn(slot)
+    try:
+        while pids:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = pids.pop(pid, None)
+            # Replace workers that died unexpectedly
+            if not stopping and slot is not None:
+                spawn(slot)
+    finally:
+        sock.close()
+        try:
+            remove_socket(path, identity)
+        except FileExistsError:
+            pass
@@ -0,0 +1,287 @@
+"""A sidecar file with the byte offsets of page numbers, section headers and milestones of a mARkdown file.
+
+The index is written once next to the file, as `<path>.oimdp-index`, and rebuilt when the file changes.
+If it cannot be written there, it is rebuilt in memory each time it is needed.
+It lets `parse_range` read and parse a few pages of a large file without going through all of it.
+
+The sidecar file starts with a line of JSON describing it, followed by tables of fixed-size records:
+pages, headers and milestones in document order, then the page numbers sorted by page and volume.
+Entries are read from the file when needed, so looking up a page takes a few small reads whatever
+the size of the file. `parse_range` only needs pages; headers and milestones are there for tools that
+jump to a section or a milestone, see SidecarIndex.
+"""
+import io
+import json
+import os
+import re
+import struct
+from .extract import line_text
+from .parser import PAGE_RE, MILESTONE_RE, HEADER_PATTERN_GROUPED, parser
+from . import tags as t
+
+SIDECAR_EXTENSION = ".oimdp-index"
+INDEX_VERSION = 3
+HEADER_RE = re.compile(HEADER_PATTERN_GROUPED)
+# Byte offset of the structure, of the start and end of its line, and line index
+POSITIONS = struct.Struct("<qqqq")
+LEVEL = struct.Struct("<q")
+SEQ = struct.Struct("<q")
+
+
+def build_index(path: str):
+    """Scans a mARkdown file and returns its index.
+
+    Each entry has the byte offset of the structure and the offsets of the start and end of its line,
+    followed by the line index. As in the parser, page numbers and milestones are only taken from page
+    lines and lines split into line parts, not from metadata or headers:
+
+    - `pages`: [volume, page, offset, line start, line end, line index]
+    - `headers`: [level, offset, line start, line end, line index]
+    - `milestones`: [milestone, offset, line start, line end, line index]
+    """
+    stat = os.stat(path)
+    pages = []
+    headers = []
+    milestones = []
+    offset = 0
+    with open(path, "rb") as f:
+        for i, raw in enumerate(f):
+            end = offset + len(raw)
+            has_page = t.PAGE.encode() in raw
+            has_milestone = b"ms" in raw or t.MILESTONE.encode() in raw
+            if has_page or has_milestone or raw.startswith(t.HEADER.encode()):
+                line = raw.decode("utf-8")
+                if line.startswith(t.PAGE):
+                    # The parser only takes the first page number of a page line
+                    found = PAGE_RE.search(line)
+                    page_matches = [found] if found else []
+                    milestone_matches = []
+                elif line_text(line.rstrip("\r\n")) is None:
+                    page_matches = milestone_matches = []
+                else:
+                    page_matches = PAGE_RE.finditer(line) if has_page else []
+                    milestone_matches = MILESTONE_RE.finditer(line) if has_milestone else []
+                for m in page_matches:
+                    pos = offset + len(line[:m.start()].encode("utf-8"))
+                    pages.append([m.group(1), m.group(2), pos, offset, end, i])
+                for m in milestone_matches:
+                    pos = offset + len(line[:m.start()].encode("utf-8"))
+                    milestones.append([m.group(), pos, offset, end, i])
+                if line.startswith(t.HEADER):
+                    headers.append([len(HEADER_RE.match(line).group(1)), offset, offset, end, i])
+            offset = end
+    return {
+        "version": INDEX_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "pages": pages,
+        "headers": headers,
+        "milestones": milestones,
+    }
+
+
+def page_key(page: str, volume: str = None):
+    # Keys sort by page then volume, and are padded with zero bytes in the sidecar file
+    key = page.encode("utf-8") + b"\0"
+    if volume is not None:
+        key += volume.encode("utf-8") + b"\0"
+    return key
+
+
+def dump_index(index: dict, f):
+    """Writes an index returned by build_index to a binary file"""
+    pages, headers, milestones = index["pages"], index["headers"], index["milestones"]
+    keys = [page_key(p[1], p[0]) for p in pages]
+    key_width = max(map(len, keys), default=0)
+    milestone_width = max((len(m[0].encode("utf-8")) for m in milestones), default=0)
+    description = {
+        "version": INDEX_VERSION,
+        "size": index["size"],
+        "mtime_ns": index["mtime_ns"],
+        "pages": len(pages),
+        "headers": len(headers),
+        "milestones": len(milestones),
+        "key_width": key_width,
+        "milestone_width": milestone_width,
+    }
+    f.write(json.dumps(description).encode("utf-8") + b"\n")
+    for key, p in zip(keys, pages):
+        f.write(key.ljust(key_width, b"\0") + POSITIONS.pack(*p[2:]))
+    for h in headers:
+        f.write(LEVEL.pack(h[0]) + POSITIONS.pack(*h[1:]))
+    for m in milestones:
+        f.write(m[0].encode("utf-8").ljust(milestone_width, b"\0") + POSITIONS.pack(*m[1:]))
+    for n in sorted(range(len(pages)), key=lambda n: (keys[n].ljust(key_width, b"\0"), n)):
+        f.write(SEQ.pack(n))
+
+
+def write_index(path: str, index: dict = None):
+    """Builds the index of a mARkdown file, if not given, and writes it to its sidecar file"""
+    if index is None:
+        index = build_index(path)
+    tmp = f"{path}{SIDECAR_EXTENSION}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            dump_index(index, f)
+        # Readers never see a partly written index
+        os.replace(tmp, path + SIDECAR_EXTENSION)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+class SidecarIndex:
+    """An open sidecar file, given by its path or as a binary file object.
+    Entries are read when needed, in the same form as in build_index.
+    """
+    def __init__(self, file):
+        self.file = open(file, "rb") if isinstance(file, str) else file
+        try:
+            description = json.loads(self.file.readline(4096))
+        except ValueError:
+            description = {}
+        if not isinstance(description, dict):
+            description = {}
+        self.version = description.get("version")
+        self.size = description.get("size")
+        self.mtime_ns = description.get("mtime_ns")
+        if self.version != INDEX_VERSION:
+            return
+        self.counts = {name: description[name] for name in ("pages", "headers", "milestones")}
+        self.key_width = description["key_width"]
+        self.milestone_width = description["milestone_width"]
+        self.record_sizes = {
+            "pages": self.key_width + POSITIONS.size,
+            "headers": LEVEL.size + POSITIONS.size,
+            "milestones": self.milestone_width + POSITIONS.size,
+            "sorted_pages": SEQ.size,
+        }
+        self.starts = {}
+        start = self.file.tell()
+        for name in ("pages", "headers", "milestones", "sorted_pages"):
+            self.starts[name] = start
+            start += self.record_sizes[name] * self.counts["pages" if name == "sorted_pages" else name]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def count(self, table: str):
+        return self.counts[table]
+
+    def read(self, table: str, n: int):
+        size = self.record_sizes[table]
+        self.file.seek(self.starts[table] + n * size)
+        return self.file.read(size)
+
+    def page(self, n: int):
+        """The n-th page number of the file: [volume, page, offset, line start, line end, line index]"""
+        record = self.read("pages", n)
+        page, volume = record[:self.key_width].rstrip(b"\0").decode("utf-8").split("\0")
+        return [volume, page, *POSITIONS.unpack(record[self.key_width:])]
+
+    def header(self, n: int):
+        """The n-th section header of the file: [level, offset, line start, line end, line index]"""
+        record = self.read("headers", n)
+        return [*LEVEL.unpack(record[:LEVEL.size]), *POSITIONS.unpack(record[LEVEL.size:])]
+
+    def milestone(self, n: int):
+        """The n-th milestone of the file: [milestone, offset, line start, line end, line index]"""
+        record = self.read("milestones", n)
+        name = record[:self.milestone_width].rstrip(b"\0").decode("utf-8")
+        return [name, *POSITIONS.unpack(record[self.milestone_width:])]
+
+    def sorted_key(self, n: int):
+        seq = SEQ.unpack(self.read("sorted_pages", n))[0]
+        return self.read("pages", seq)[:self.key_width], seq
+
+    def lower_bound(self, key: bytes):
+        lo, hi = 0, self.counts["pages"]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.sorted_key(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find_page(self, page: str, volume: str = None, last: bool = False):
+        """Returns the position of the first, or last, page number with a page (and volume) in the file"""
+        key = page_key(page, volume)
+        # Zero bytes pad keys and 0xff never occurs in UTF-8: [start, end) holds the keys starting with `key`
+        start, end = self.lower_bound(key), self.lower_bound(key + b"\xff")
+        if start == end:
+            raise Exception(f"Could not find page {page}" + (f" in volume {volume}" if volume else ""))
+        found = [self.sorted_key(n)[1] for n in range(start, end)] if volume is None else \
+            [self.sorted_key(end - 1 if last else start)[1]]
+        return max(found) if last else min(found)
+
+
+def load_index(path: str):
+    """Opens the index of a mARkdown file from its sidecar file, which is (re)written if missing or outdated.
+
+    Returns a SidecarIndex, to be closed after use. When the sidecar file cannot be written, for instance
+    on a read-only file system, the index is built anew and kept in memory.
+    """
+    stat = os.stat(path)
+    try:
+        index = SidecarIndex(path + SIDECAR_EXTENSION)
+        if index.version == INDEX_VERSION and index.size == stat.st_size and index.mtime_ns == stat.st_mtime_ns:
+            return index
+        index.close()
+    except (OSError, KeyError):
+        pass
+    index = build_index(path)
+    try:
+        write_index(path, index)
+    except OSError:
+        f = io.BytesIO()
+        dump_index(index, f)
+        f.seek(0)
+        return SidecarIndex(f)
+    return SidecarIndex(path + SIDECAR_EXTENSION)
+
+
+def read_range(path: str, from_page: str = None, to_page: str = None, volume: str = None):
+    """Reads the text of a range of pages, as whole lines.
+
+    As in OpenITI texts, a page number marks the end of its page: the range starts after the page number
+    preceding `from_page` and ends with `to_page`. Since page numbers can be in the middle of a line, the
+    first and last lines may include text from the neighbouring pages.
+
+    Without a `volume`, the range stays in the volume of the first page number found for `from_page`,
+    or for `to_page`.
+    """
+    with load_index(path) as index:
+        start = 0
+        end = index.size
+        if from_page is not None:
+            n = index.find_page(from_page, volume)
+            start = index.page(n - 1)[3] if n > 0 else 0
+            volume = index.page(n)[0]
+        if to_page is not None:
+            if volume is None:
+                volume = index.page(index.find_page(to_page))[0]
+            end = index.page(index.find_page(to_page, volume, last=True))[4]
+
+    with open(path, "rb") as f:
+        magic_value = f.readline()
+        f.seek(start)
+        data = f.read(max(end - start, 0))
+    if start > 0:
+        data = magic_value + data
+    return data.decode("utf-8")
+
+
+def parse_range(path: str, from_page: str = None, to_page: str = None, volume: str = None, strict: bool = False):
+    """Parses a range of pages of a mARkdown file, see read_range.
+
+    Line indexes of the resulting Document are relative to the range.
+    """
+    return parser(read_range(path, from_page, to_page, volume), strict)
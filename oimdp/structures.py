@@ -1,4 +1,9 @@
+import sys
+from array import array
+from bisect import bisect_right
+from heapq import merge
 from typing import List, Literal
+from .normalize import normalize, normalize_many
 
 
 class MagicValue:
@@ -13,6 +18,8 @@ class MagicValue:
 
 class SimpleMetadataField:
     """A non-machine readable metadata field"""
+    line_index = None
+
     def __init__(self, orig: str, value: str):
         self.orig = orig
         self.value = value
@@ -67,6 +74,8 @@ class NamedEntity(LinePart):
         self.prefix = prefix
         self.extent = extent
         self.ne_type: Literal["top", "per", "soc", "src"] = ne_type
+        # Source of the words included in `text`, whitespace and all
+        self.text_orig = ""
 
     def __str__(self):
         return self.text
@@ -82,7 +91,7 @@ class OpenTagUser(LinePart):
         self.t_subsubtype = t_subsubtype
 
     def __str__(self):
-        return self.value
+        return ""
 
 
 class OpenTagAuto(LinePart):
@@ -95,7 +104,7 @@ class OpenTagAuto(LinePart):
         self.review = review
 
     def __str__(self):
-        return self.value
+        return ""
 
 
 class Milestone(LinePart):
@@ -118,6 +127,10 @@ class Hukm(LinePart):
 
 class Line:
     """A line of text that may contain parts"""
+    line_index = None
+    # Normalized versions of text_only by profile name, see oimdp.normalize
+    normalized = None
+
     def __init__(self, orig: str, text_only: str, parts: List[LinePart] = None):
         self.orig = orig
         self.text_only = text_only
@@ -129,12 +142,22 @@ class Line:
     def add_part(self, part: LinePart):
         self.parts.append(part)
 
+    def get_normalized_text(self, profile: str = "default"):
+        """Gets text_only normalized with a profile from oimdp.normalize, caching the result"""
+        if self.normalized is None:
+            self.normalized = {}
+        if profile not in self.normalized:
+            self.normalized[profile] = normalize(self.text_only, profile)
+        return self.normalized[profile]
+
     def __str__(self):
         return "".join([str(p) for p in self.parts])
 
 
 class PageNumber():
     """A page and volume number. Can be Content or LinePart object"""
+    line_index = None
+
     def __init__(self, orig: str, vol: str, page: str):
         self.orig = orig
         self.page = page
@@ -146,6 +169,8 @@ class PageNumber():
 
 class Content:
     """A content structure"""
+    line_index = None
+
     def __init__(self, orig: str):
         self.orig = orig
 
@@ -231,7 +256,7 @@ class DoxographicalItem(Content):
         self.dox_type: Literal["pos", "sec"] = dox_type
 
     def __str__(self):
-        return self.value
+        return ""
 
 
 class MorphologicalPattern(Content):
@@ -245,8 +270,15 @@ class MorphologicalPattern(Content):
 
 
 class AdministrativeRegion(Content):
-    """An administrative region"""
-    # TODO
+    """An administrative region and its subdivisions"""
+    def __init__(self, orig: str, division: str, name: str, region_type: str, subdivision: str,
+                 subdivisions: List[str]):
+        self.orig = orig
+        self.division = division
+        self.name = name
+        self.region_type = region_type
+        self.subdivision = subdivision
+        self.subdivisions = subdivisions
 
     def __str__(self):
         return ""
@@ -272,32 +304,176 @@ class Riwayat(Paragraph):
     """Riwāyāt unit"""
 
 
+class Diagnostic:
+    """A structure that could not be parsed, see parser's `errors` argument"""
+    def __init__(self, line_index: int, column: int, text: str, kind: str, message: str):
+        self.line_index = line_index
+        self.column = column
+        self.text = text
+        self.kind = kind
+        self.message = message
+
+    def __str__(self):
+        return f"{self.line_index + 1}:{self.column + 1}: {self.message} ({self.kind}: {self.text})"
+
+
+def deep_sizeof(obj, seen: set, nested: list):
+    """Returns the size in bytes of an object and of the objects it references, except for objects already `seen`.
+
+    Structures referenced by the object, e.g. the parts of a Line, are not counted but added to `nested`.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, type):
+            continue
+        if o is not obj and hasattr(o, "__dict__"):
+            nested.append(o)
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return size
+
+
 class Document:
     """The OpenITI mARkdown document"""
     def __init__(self, text):
         self.orig_text = text
         self.simple_metadata = []
         self.content = []
+        # (line index, original line) for lines that produced no structure
+        self.unparsed_lines = []
+        # Content and part positions of each structure class
+        self.type_index = {}
+        # Structures that could not be parsed, when parsing with errors="collect"
+        self.diagnostics = []
 
     def set_magic_value(self, orig: str):
         self.magic_value = MagicValue(orig)
 
-    def set_simple_metadata_field(self, orig: str, value: str):
-        self.simple_metadata.append(SimpleMetadataField(orig, value))
+    def set_simple_metadata_field(self, orig: str, value: str, line_index: int = None):
+        field = SimpleMetadataField(orig, value)
+        field.line_index = line_index
+        self.simple_metadata.append(field)
 
-    def add_content(self, content: Content):
+    def add_content(self, content: Content, line_index: int = None):
+        if content is not None and line_index is not None:
+            content.line_index = line_index
+        self.index_content(len(self.content), content)
         self.content.append(content)
 
-    def get_clean_text(self, includeMetadata: bool = False):
+    def index_content(self, pos: int, content: Content):
+        """Adds a content structure and its parts to the per-type positions index"""
+        if content is None:
+            return
+        self.add_to_index(type(content), pos, -1)
+        if isinstance(content, Line):
+            for part_pos, part in enumerate(content.parts):
+                self.add_to_index(type(part), pos, part_pos)
+
+    def add_to_index(self, cls: type, pos: int, part_pos: int):
+        if cls not in self.type_index:
+            self.type_index[cls] = (array("l"), array("l"))
+        positions, part_positions = self.type_index[cls]
+        positions.append(pos)
+        part_positions.append(part_pos)
+
+    def reindex(self):
+        """Rebuilds the per-type positions index, e.g. after changing content or line parts"""
+        self.type_index = {}
+        for pos, content in enumerate(self.content):
+            self.index_content(pos, content)
+
+    def select(self, cls: type, context: bool = False, **filters):
+        """Iterates over the content structures and line parts of a given class in document order.
+
+        Keyword arguments filter structures by attribute value, e.g. `select(OpenTagAuto, category="Category")`.
+        With `context`, yields (structure, enclosing line, enclosing section header) tuples instead.
+        """
+        indexes = [zip(*positions) for t, positions in self.type_index.items() if issubclass(t, cls)]
+        sections = self.type_index.get(SectionHeader, ([],))[0]
+        for pos, part_pos in merge(*indexes):
+            line = self.content[pos] if part_pos >= 0 else None
+            item = line.parts[part_pos] if part_pos >= 0 else self.content[pos]
+            if any(getattr(item, attr, None) != value for attr, value in filters.items()):
+                continue
+            if context:
+                section_pos = bisect_right(sections, pos)
+                section = self.content[sections[section_pos - 1]] if section_pos else None
+                yield item, line, section
+            else:
+                yield item
+
+    def add_diagnostic(self, diagnostic: Diagnostic):
+        self.diagnostics.append(diagnostic)
+
+    def add_unparsed_line(self, orig: str, line_index: int):
+        self.unparsed_lines.append((line_index, orig))
+
+    def get_clean_text(self, includeMetadata: bool = False, profile: str = None):
         text = ""
         if (includeMetadata):
             text += "Metadata:\n"
             text += "\n".join([str(md) for md in self.simple_metadata])
             text += "\n\n"
 
-        text += "\n".join([str(c) for c in self.content])
+        text += "\n".join([str(c) for c in self.content if c is not None])
 
+        if profile:
+            text = normalize(text, profile)
         return text
 
+    def normalize(self, profile: str = "default"):
+        """Normalizes the text of all lines at once and caches it on them, see Line.get_normalized_text"""
+        lines = [line for line in self.select(Line) if line.normalized is None or profile not in line.normalized]
+        for line, normalized in zip(lines, normalize_many([line.text_only for line in lines], profile)):
+            if line.normalized is None:
+                line.normalized = {}
+            line.normalized[profile] = normalized
+
+    def memory_report(self):
+        """Returns the memory taken by the document, in bytes, with a breakdown by structure class.
+
+        `classes` maps class names to the number of structures and their deep size. Objects shared by
+        several structures, such as interned strings, are counted once. `bytes_per_input_byte` compares
+        the total to the size of the UTF-8 input, including the copy of it kept in `orig_text`.
+        """
+        seen = {id(self)}
+        orig_text = deep_sizeof(self.orig_text, seen, [])
+        type_index = deep_sizeof(self.type_index, seen, [])
+        unparsed_lines = deep_sizeof(self.unparsed_lines, seen, [])
+        structures = []
+        document = sys.getsizeof(self) + deep_sizeof(vars(self), seen, structures)
+        classes = {}
+        while structures:
+            structure = structures.pop()
+            if id(structure) in seen:
+                continue
+            size = deep_sizeof(structure, seen, structures)
+            count, total = classes.get(type(structure).__name__, (0, 0))
+            classes[type(structure).__name__] = (count + 1, total + size)
+
+        total = document + orig_text + type_index + unparsed_lines + sum(size for _, size in classes.values())
+        input_bytes = len(self.orig_text.encode("utf-8"))
+        return {
+            "classes": {name: {"count": count, "bytes": size}
+                        for name, (count, size) in sorted(classes.items(), key=lambda c: -c[1][1])},
+            "document": document,
+            "orig_text": orig_text,
+            "type_index": type_index,
+            "unparsed_lines": unparsed_lines,
+            "total": total,
+            "input_bytes": input_bytes,
+            "bytes_per_input_byte": total / input_bytes if input_bytes else 0,
+        }
+
     def __str__(self):
         return self.orig_text
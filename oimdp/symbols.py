@@ -0,0 +1,29 @@
+class SymbolTable:
+    """A table of shared strings.
+
+    Tag attributes such as named entity types, open tag users and categories or volume numbers
+    come from small vocabularies. Interning them lets all structures, across documents,
+    refer to a single copy of each value.
+    """
+    def __init__(self):
+        self.symbols = {}
+
+    def intern(self, value: str):
+        # setdefault is atomic, so tables can be shared between threads
+        if value is None:
+            return None
+        return self.symbols.setdefault(value, value)
+
+    def clear(self):
+        """Forgets all values. Structures keep theirs, but new ones no longer share them"""
+        self.symbols.clear()
+
+    def __contains__(self, value: str):
+        return value in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+# The symbol table shared by the parser, it can be reused by other tools working with parsed documents
+SYMBOLS = SymbolTable()
@@ -0,0 +1,103 @@
+"""Fast extraction of the table of contents of a mARkdown file.
+
+Only lines starting with `###` are decoded and looked at, so that building the table of contents
+of a large file costs little more than reading it.
+"""
+from typing import Iterable, Union
+from .parser import bio_or_event, dictionary_unit, is_bio_or_event, parse_header, remove_phrase_lv_tags
+from .structures import BioOrEvent, DictionaryUnit, SectionHeader
+from . import tags as t
+
+
+class TocEntry:
+    """A section header, biography, event or dictionary unit in a table of contents.
+
+    `title` is the text of the header, or of the first line of a unit, cleaned as by the parser.
+    `level` is the header level, None for units. `unit_type` is the `be_type` or `dic_type` of a unit.
+    `line_index` is the index of the line in the file and `offset` the byte offset of its start, None if
+    it is not known, see extract_toc.
+    """
+    def __init__(self, structure: type, title: str, level: int, line_index: int, offset: int,
+                 unit_type: str = None):
+        self.structure = structure
+        self.title = title
+        self.level = level
+        self.line_index = line_index
+        self.offset = offset
+        self.unit_type = unit_type
+        self.children = []
+
+    def to_dict(self):
+        return {
+            "type": self.structure.__name__,
+            "title": self.title,
+            "level": self.level,
+            "unit_type": self.unit_type,
+            "line_index": self.line_index,
+            "offset": self.offset,
+            "children": [c.to_dict() for c in self.children],
+        }
+
+
+def toc_entry(il: str, i: int, offset: int):
+    """Returns the table of contents entry of a `###` line, if any, in the same order of checks as the parser"""
+    if il.startswith(t.EDITORIAL) or il.startswith(t.APPENDIX) or il.startswith(t.PARATEXT):
+        return None
+    if il.startswith(t.HEADER):
+        value, level = parse_header(il)
+        return TocEntry(SectionHeader, value, level, i, offset)
+    if il.startswith(t.DIC):
+        no_tag, dic_type = dictionary_unit(il)
+        return TocEntry(DictionaryUnit, first_line_title(no_tag), None, i, offset, dic_type)
+    if il.startswith(t.DOX):
+        return None
+    if is_bio_or_event(il):
+        no_tag, be_type = bio_or_event(il)
+        return TocEntry(BioOrEvent, first_line_title(no_tag), None, i, offset, be_type)
+    return None
+
+
+def first_line_title(no_tag: str):
+    # The text_only of the first line of the unit, see parser.parse_line
+    return remove_phrase_lv_tags(no_tag.replace(t.LINE, '')) or None
+
+
+def raw_lines(source: Union[str, bytes, Iterable[Union[str, bytes]]]):
+    if isinstance(source, str):
+        return source.splitlines(keepends=True)
+    if isinstance(source, bytes):
+        return source.splitlines(keepends=True)
+    return source
+
+
+def extract_toc(source: Union[str, bytes, Iterable[Union[str, bytes]]]):
+    """Returns the table of contents of a mARkdown file as a list of nested TocEntry objects.
+
+    The source is the text of a document or its UTF-8 bytes, or an iterable of lines such as an open
+    file; a file opened in binary mode is fastest. Headers are nested under the last header of a lower
+    level, biographies, events and dictionary units under the last header.
+
+    Byte offsets are only given for bytes, binary lines and whole texts, where line breaks are kept as
+    they are. A file opened in text mode translates `\\r\\n` to `\\n`, so the offsets of its lines are None.
+    """
+    toc = []
+    # Open headers, from the outermost
+    open_headers = []
+    offset = 0
+    text_lines = not isinstance(source, (str, bytes))
+    for i, raw in enumerate(raw_lines(source)):
+        if text_lines and isinstance(raw, str):
+            offset = None
+        if raw[:3] in (b"###", "###"):
+            il = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+            entry = toc_entry(il.rstrip("\r\n"), i, offset)
+            if entry is not None:
+                if entry.level is not None:
+                    while open_headers and open_headers[-1].level >= entry.level:
+                        open_headers.pop()
+                (open_headers[-1].children if open_headers else toc).append(entry)
+                if entry.level is not None:
+                    open_headers.append(entry)
+        if offset is not None:
+            offset += len(raw) if isinstance(raw, bytes) or raw.isascii() else len(raw.encode("utf-8"))
+    return toc
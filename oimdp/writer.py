@@ -0,0 +1,234 @@
+import re
+from heapq import merge
+from typing import Iterator, TextIO
+from .structures import Age, Date, Document, NamedEntity, OpenTagAuto, OpenTagUser, PageNumber, Paragraph, Line, Verse
+from .structures import SectionHeader, DictionaryUnit, BioOrEvent, DoxographicalItem, MorphologicalPattern, TextPart
+from .structures import RouteOrDistance, Riwayat
+from .parser import PAGE_RE, HEADER_PATTERN_GROUPED, remove_phrase_lv_tags
+from . import tags as t
+
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+DATE_TAGS = {"birth": t.YEAR_BIRTH, "death": t.YEAR_DEATH, "other": t.YEAR_OTHER, "age": t.YEAR_AGE}
+# Full tag first: it is used when a named entity changes type
+NAMED_ENTITY_TAGS = {
+    "top": [t.TOP_FULL, t.TOP],
+    "per": [t.PER_FULL, t.PER],
+    "soc": [t.SOC_FULL, t.SOC],
+    "src": [t.SRC],
+}
+# Unit tags and the type the parser assigns to them
+DICTIONARY_TYPES = {t.DIC_NIS: "nis", t.DIC_TOP: "top", t.DIC_LEX: "lex", t.DIC_BIB: "bib"}
+DOXOGRAPHICAL_TYPES = {t.DOX_POS: "pos", t.DOX_SEC: "sec"}
+BIO_OR_EVENT_TYPES = {
+    t.LIST_NAMES_FULL: "names", t.LIST_NAMES: "names",
+    t.BIO_REF_FULL: "ref", t.BIO_REF: "ref",
+    t.BIO_WOM_FULL: "wom", t.BIO_WOM: "wom",
+    t.BIO_MAN_FULL: "man", t.BIO_MAN: "man",
+    t.LIST_EVENTS: "events", t.EVENT: "event",
+    t.LIST_EVENTS_FULL: "man", t.EVENT_FULL: "man",
+}
+BIO_OR_EVENT_TAGS = {
+    "man": t.BIO_MAN_FULL, "wom": t.BIO_WOM_FULL, "ref": t.BIO_REF_FULL,
+    "names": t.LIST_NAMES_FULL, "events": t.LIST_EVENTS, "event": t.EVENT,
+}
+# Unit tags and types, the tag used for each type, the parser's default type and the type attribute
+UNITS = {
+    DictionaryUnit: (DICTIONARY_TYPES, {v: k for k, v in DICTIONARY_TYPES.items()}, "bib", "dic_type"),
+    DoxographicalItem: (DOXOGRAPHICAL_TYPES, {v: k for k, v in DOXOGRAPHICAL_TYPES.items()}, "pos", "dox_type"),
+    BioOrEvent: (BIO_OR_EVENT_TYPES, BIO_OR_EVENT_TAGS, "man", "be_type"),
+}
+MORPHO_RE = re.compile(r"#~:([^:]+?):")
+HEADER_RE = re.compile(HEADER_PATTERN_GROUPED)
+
+
+def words(s: str):
+    """ normalize whitespace the way the parser does for words included in named entities """
+    return "".join([w + " " for w in s.split()])
+
+
+def replace_span(s: str, start: int, end: int, value: str):
+    return s[:start] + value + s[end:]
+
+
+def write_page(page: PageNumber):
+    m = PAGE_RE.search(page.orig)
+    if m and m.group(1) == page.volume and m.group(2) == page.page:
+        return page.orig
+    value = f"{t.PAGE}{page.volume}P{page.page}"
+    if m:
+        return replace_span(page.orig, m.start(), m.end(), value)
+    return value
+
+
+def write_named_entity(ne: NamedEntity):
+    tags = NAMED_ENTITY_TAGS[ne.ne_type]
+    tag = next((tag for tag in tags if ne.orig.startswith(tag)), tags[0])
+    value = f"{tag}{ne.prefix}{ne.extent}"
+    # Include the exact source of the words, unless they've been changed
+    if ne.text == words(ne.text_orig):
+        return value + ne.text_orig
+    return value + " " + " ".join(ne.text.split())
+
+
+def write_part(part, previous=None):
+    """ regenerate the mARkdown of a line part """
+    if isinstance(part, TextPart):
+        # Text following a named entity has its whitespace normalized by the parser
+        if part.text == part.orig or (isinstance(previous, NamedEntity) and part.text == words(part.orig)):
+            return part.orig
+        return part.text
+    elif isinstance(part, NamedEntity):
+        return write_named_entity(part)
+    elif isinstance(part, PageNumber):
+        return write_page(part)
+    elif isinstance(part, Date):
+        return DATE_TAGS[part.date_type] + part.value
+    elif isinstance(part, Age):
+        return t.YEAR_AGE + part.value
+    elif isinstance(part, OpenTagUser):
+        subsubtype = f"_{part.t_subsubtype}" if part.t_subsubtype else ""
+        return f"@{part.user}@{part.t_type}_{part.t_subtype}{subsubtype}@"
+    elif isinstance(part, OpenTagAuto):
+        review = f"-@{part.review}@" if part.review else ""
+        return f"@{part.resp}@{part.t_type}@{part.category}@{review}"
+    # Words included by a named entity can end up on another tag, see parse_line
+    return part.orig + getattr(part, "text_orig", "")
+
+
+def write_line(line: Line):
+    """ regenerate the mARkdown of a line from its parts, without line or paragraph markers """
+    out = []
+    previous = None
+    for part in line.parts:
+        out.append(write_part(part, previous))
+        previous = part
+    return "".join(out)
+
+
+def write_header(header: SectionHeader):
+    value = f"### {'|' * header.level}{header.value}"
+    if value == header.orig:
+        return value
+    # Headers may contain phrase-level tags that have been removed from their value
+    m = HEADER_RE.match(header.orig)
+    if m and len(m.group(1)) == header.level \
+            and remove_phrase_lv_tags(HEADER_RE.sub('', header.orig)) == header.value:
+        return header.orig
+    return value
+
+
+def unit_tag(unit):
+    """ get the tag the source line of a unit starts with, and the tag it should be written with """
+    types, tags, default, type_attr = next(v for k, v in UNITS.items() if isinstance(unit, k))
+    unit_type = getattr(unit, type_attr)
+    found = ""
+    for tag in types:
+        if unit.orig.startswith(tag) and len(tag) > len(found):
+            found = tag
+    if found and types[found] == unit_type:
+        return found, found
+    if not found and unit_type == default:
+        # The parser kept the whole source line as the unit's first line
+        return found, ""
+    return found, tags[unit_type]
+
+
+def write_opener(content):
+    """ get the marker that opens the line of a paragraph-like structure """
+    if isinstance(content, Riwayat):
+        return t.RWY
+    elif isinstance(content, Paragraph):
+        return "#"
+    return unit_tag(content)[1]
+
+
+def write_content(content):
+    """ regenerate the mARkdown of a content structure that takes a line on its own """
+    if isinstance(content, PageNumber):
+        return write_page(content)
+    elif isinstance(content, RouteOrDistance):
+        return write_line(content)
+    elif isinstance(content, Verse):
+        return "#" + write_line(content)
+    elif isinstance(content, Line):
+        return t.LINE + write_line(content)
+    elif isinstance(content, SectionHeader):
+        return write_header(content)
+    elif isinstance(content, MorphologicalPattern):
+        m = MORPHO_RE.search(content.orig)
+        if m and m.group(1) != content.category:
+            return replace_span(content.orig, m.start(1), m.end(1), content.category)
+        return content.orig
+    elif isinstance(content, Paragraph):
+        return write_opener(content)
+    elif isinstance(content, tuple(UNITS)):
+        # The unit has no line of its own, so only its tag may have changed
+        found, tag = unit_tag(content)
+        return tag + content.orig[len(found):]
+    return content.orig
+
+
+def write_metadata(field):
+    if field.orig.startswith(t.META) and field.orig.split(t.META, 1)[1].strip() == field.value:
+        return field.orig
+    return f"{t.META} {field.value}"
+
+
+def iter_lines(document: Document) -> Iterator[str]:
+    """Generates the lines of an OpenITI mARkdown file from a Document object"""
+    magic_value = getattr(document, "magic_value", None)
+    yield magic_value.orig if magic_value else "######OpenITI#"
+
+    # Lines that are not part of the content are put back in their original position
+    pending = merge(
+        ((field.line_index or 0, write_metadata(field)) for field in document.simple_metadata),
+        document.unparsed_lines,
+        key=lambda item: item[0]
+    )
+    waiting = next(pending, None)
+
+    content = document.content
+    pos = 0
+    while pos < len(content):
+        c = content[pos]
+        pos += 1
+        if c is None:
+            continue
+        if c.line_index is not None:
+            while waiting and waiting[0] < c.line_index:
+                yield waiting[1]
+                waiting = next(pending, None)
+
+        if isinstance(c, (Paragraph, *UNITS)):
+            # A paragraph-like structure shares its source line with the following line
+            following = content[pos] if pos < len(content) else None
+            if type(following) is Line and following.line_index == c.line_index:
+                pos += 1
+                yield write_opener(c) + write_line(following)
+                continue
+        yield write_content(c)
+
+    while waiting:
+        yield waiting[1]
+        waiting = next(pending, None)
+
+
+def line_terminator(text: str):
+    """Returns the first line break of a text, "\\n" if it has none"""
+    m = LINE_BREAK_RE.search(text)
+    return m.group() if m else "\n"
+
+
+def writer(document: Document, fp: TextIO):
+    """Writes a Document object to a file object as OpenITI mARkdown
+
+    Lines end with the first line break of the source text, so only sources with a single kind of line
+    break are written back unchanged. To keep "\\r\\n" line breaks, read and write files with `newline=""`.
+    """
+    newline = line_terminator(document.orig_text)
+    for n, line in enumerate(iter_lines(document)):
+        if n:
+            fp.write(newline)
+        fp.write(line)
+    if document.orig_text.endswith(("\n", "\r")):
+        fp.write(newline)
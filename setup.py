@@ -16,5 +16,11 @@ setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     test_suite="tests",
+    entry_points={
+        "console_scripts": ["oimdp=oimdp.__main__:main"],
+    },
     python_requires=">=3.8",
+    extras_require={
+        "reuse": ["numpy"],
+    },
 )
@@ -0,0 +1,98 @@
+"""Checks the peak memory allocated by oimdp.parse on reference inputs against a baseline.
+
+    python tests/memory.py                 # fails if a peak exceeds its baseline by more than the threshold
+    python tests/memory.py --update        # records the current peaks as the baseline
+    python tests/memory.py --threshold 0.05 other.md
+
+Peaks depend on the Python version, so the baseline keeps them per version.
+"""
+import argparse
+import json
+import sys
+import os
+import tracemalloc
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+import oimdp
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_INPUTS = [os.path.join(TESTS_DIR, "test.md")]
+BASELINE = os.path.join(TESTS_DIR, "memory_baseline.json")
+THRESHOLD = 0.1
+
+
+def python_version():
+    return "{}.{}".format(*sys.version_info[:2])
+
+
+def measure(path: str):
+    """Returns the peak memory allocated while parsing a file, in bytes, not counting the text read"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    tracemalloc.start()
+    try:
+        oimdp.parse(text)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def load_baseline(path: str = BASELINE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def check(paths=REFERENCE_INPUTS, baseline_path: str = BASELINE, threshold: float = THRESHOLD):
+    """Measures each input and returns (name, peak, baseline peak, regressed) tuples.
+
+    The baseline peak is None for inputs without a baseline for this Python version.
+    """
+    baseline = load_baseline(baseline_path).get(python_version(), {})
+    results = []
+    for path in paths:
+        name = os.path.basename(path)
+        peak = measure(path)
+        expected = baseline.get(name)
+        results.append((name, peak, expected, expected is not None and peak > expected * (1 + threshold)))
+    return results
+
+
+def update(paths=REFERENCE_INPUTS, baseline_path: str = BASELINE):
+    """Records the current peaks of the inputs as the baseline for this Python version"""
+    baseline = load_baseline(baseline_path)
+    peaks = baseline.setdefault(python_version(), {})
+    for path in paths:
+        peaks[os.path.basename(path)] = measure(path)
+    with open(baseline_path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return peaks
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    args.add_argument("paths", nargs="*", default=REFERENCE_INPUTS)
+    args.add_argument("--baseline", default=BASELINE)
+    args.add_argument("--threshold", type=float, default=THRESHOLD,
+                      help="allowed increase over the baseline, as a fraction (default: %(default)s)")
+    args.add_argument("--update", action="store_true", help="record the current peaks as the baseline")
+    args = args.parse_args()
+
+    if args.update:
+        for name, peak in update(args.paths, args.baseline).items():
+            print(f"{name}: {peak} bytes")
+        sys.exit(0)
+
+    failed = False
+    for name, peak, expected, regressed in check(args.paths, args.baseline, args.threshold):
+        if expected is None:
+            print(f"{name}: {peak} bytes (no baseline for Python {python_version()})")
+            continue
+        change = (peak - expected) / expected
+        print(f"{name}: {peak} bytes ({change:+.1%} over baseline){' REGRESSION' if regressed else ''}")
+        failed = failed or regressed
+    sys.exit(1 if failed else 0)
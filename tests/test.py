@@ -2,9 +2,20 @@ import sys
 import os
 sys.path.append(
     os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+import io
+import json
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
 import unittest 
 import oimdp
-from oimdp.structures import Age, Appendix, BioOrEvent, Date, DictionaryUnit, Document, DoxographicalItem, Editorial, Hemistich, Hukm, Isnad, Line, Matn, Milestone, MorphologicalPattern, NamedEntity, OpenTagAuto, OpenTagUser, PageNumber, Paragraph, Paratext, Riwayat, RouteDist, RouteFrom, RouteOrDistance, RouteTowa, SectionHeader, TextPart, Verse
+from oimdp import export, geo, kwic, normalize, opentags, reuse, serve, sidecar, structures
+from tests import memory
+from oimdp.structures import LinePart, AdministrativeRegion, Age, Appendix, BioOrEvent, Date, DictionaryUnit, Document, DoxographicalItem, Editorial, Hemistich, Hukm, Isnad, Line, Matn, Milestone, MorphologicalPattern, NamedEntity, OpenTagAuto, OpenTagUser, PageNumber, Paragraph, Paratext, Riwayat, RouteDist, RouteFrom, RouteOrDistance, RouteTowa, SectionHeader, TextPart, Verse
 
 
 class TestStringMethods(unittest.TestCase):
@@ -184,6 +195,19 @@ class TestStringMethods(unittest.TestCase):
         self.assertEqual(self.parsed.content[81].parts[1].category, "Category")
         self.assertEqual(self.parsed.content[81].parts[1].review, "fr")
 
+    def test_opentags_str(self):
+        self.assertEqual(str(self.parsed.content[79].parts[1]), "")
+        self.assertEqual(str(self.parsed.content[81].parts[1]), "")
+        self.assertNotIn("@", str(self.parsed.content[79]))
+
+    def test_opentag_registry(self):
+        registry = opentags.OpenTagRegistry(self.parsed)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(list(registry.select(OpenTagUser, user="USER")), [self.parsed.content[79].parts[1]])
+        self.assertEqual(list(registry.select(OpenTagAuto, category="Category", reviewed=True)),
+                         [self.parsed.content[81].parts[1]])
+        self.assertEqual(registry.unreviewed(), [])
+
     def test_riwayat(self):
         self.assertTrue(isinstance(self.parsed.content[54], Riwayat))
         self.assertTrue(isinstance(self.parsed.content[55], Line))
@@ -267,7 +291,640 @@ class TestStringMethods(unittest.TestCase):
         self.assertTrue(isinstance(self.parsed.content[65].parts[0], TextPart))
         self.assertEqual(self.parsed.content[65].parts[0].orig, " جمع العرب تحت لواء الرسول محمد عليه الصلاة  والسلام، وما يضاف إلى ذلك من")
 
-    # TODO: ADMINISTRATIVE REGIONS!
+    def test_symbols(self):
+        from oimdp.symbols import SYMBOLS
+        other = oimdp.parse(self.text)
+        self.assertIn("USER", SYMBOLS)
+        self.assertIs(self.parsed.content[79].parts[1].user, other.content[79].parts[1].user)
+        self.assertIs(self.parsed.content[81].parts[1].category, other.content[81].parts[1].category)
+        self.assertIs(self.parsed.content[1].parts[1].volume, other.content[1].parts[1].volume)
+        # Tokens that can take any value are not kept in the table
+        parsed = oimdp.parse("######OpenITI#\n# a ms98765 b @YD9876\n")
+        self.assertEqual([p.orig for p in parsed.content[1].parts[1:4:2]], ["ms98765", "@YD9876"])
+        self.assertNotIn("ms98765", SYMBOLS)
+        self.assertNotIn("9876", SYMBOLS)
+
+    def test_symbol_table_clear(self):
+        from oimdp.symbols import SymbolTable
+        table = SymbolTable()
+        value = table.intern("".join(["US", "ER"]))
+        self.assertIs(table.intern("USER"), value)
+        table.clear()
+        self.assertEqual(len(table), 0)
+        self.assertNotIn("USER", table)
+
+    def test_memory_report(self):
+        report = self.parsed.memory_report()
+        self.assertEqual(report["classes"]["Line"]["count"], len(self.parsed.type_index[Line][0]))
+        self.assertEqual(report["classes"]["NamedEntity"]["count"], 9)
+        self.assertEqual(report["input_bytes"], len(self.text.encode("utf-8")))
+        self.assertEqual(report["total"], report["document"] + report["orig_text"] + report["type_index"]
+                         + report["unparsed_lines"] + sum(c["bytes"] for c in report["classes"].values()))
+        self.assertAlmostEqual(report["bytes_per_input_byte"], report["total"] / report["input_bytes"])
+        # Strings shared between structures are counted once
+        shared = "PageV01P001" * 100
+        first, second = PageNumber(shared, "01", "001"), PageNumber(shared, "01", "001")
+        seen = set()
+        self.assertGreater(structures.deep_sizeof(first, seen, []), sys.getsizeof(shared))
+        self.assertLess(structures.deep_sizeof(second, seen, []), sys.getsizeof(shared))
+
+    def test_select(self):
+        hukm = list(self.parsed.select(Hukm))
+        self.assertEqual(len(hukm), 1)
+        self.assertIs(hukm[0], self.parsed.content[56].parts[1])
+
+        auto = list(self.parsed.select(OpenTagAuto, category="Category"))
+        self.assertEqual(auto, [self.parsed.content[81].parts[1]])
+        self.assertEqual(list(self.parsed.select(OpenTagAuto, category="Other")), [])
+
+        # Subclasses are included, in document order
+        paragraphs = list(self.parsed.select(Paragraph))
+        self.assertIn(self.parsed.content[54], paragraphs)
+        self.assertLess(paragraphs.index(self.parsed.content[51]), paragraphs.index(self.parsed.content[54]))
+
+        pages = list(self.parsed.select(PageNumber, context=True))
+        self.assertEqual(pages[0], (self.parsed.content[1].parts[1], self.parsed.content[1], None))
+        deep = [p for p in pages if p[0] is self.parsed.content[96].parts[1]][0]
+        self.assertIs(deep[2], self.parsed.content[62])
+
+    def test_normalize(self):
+        self.assertEqual(normalize.normalize("أَحْمَدُ بنُ عـليّ ٱلإمام ٣٤ مكتبة على"), "احمد بن علي الامام 34 مكتبه علي")
+        self.assertEqual(normalize.normalize("أَحْمَدُ مكتبة", "light"), "أحمد مكتبة")
+        self.assertEqual(normalize.normalize_many(["أَحْمَدُ", "", "٣\x00٤"]), ["احمد", "", "3\x004"])
+        custom = normalize.Profile("custom", digits=False, mapping={"ک": "ك"})
+        normalize.register_profile(custom)
+        self.assertEqual(normalize.normalize("کتاب ٣", "custom"), "كتاب ٣")
+
+        line = self.parsed.content[3]
+        self.assertIsNone(line.normalized)
+        self.parsed.normalize()
+        self.assertEqual(line.normalized["default"], " ابو عمرو ابن العلاء واسمه")
+        self.assertEqual(line.get_normalized_text("light"), " أبو عمرو ابن العلاء واسمه")
+        self.assertEqual(export.to_dict(self.parsed, ["light"])["content"][3]["normalized"],
+                         {"default": " ابو عمرو ابن العلاء واسمه", "light": " أبو عمرو ابن العلاء واسمه"})
+        small = oimdp.parse("######OpenITI#\n# أَحْمَدُ\n### $DOX_POS$ إمام\n~~\n")
+        self.assertEqual(small.get_clean_text(profile="default"), "\n احمد\n\n امام")
+
+    def test_administrative_regions(self):
+        self.assertTrue(isinstance(self.parsed.content[106], AdministrativeRegion))
+        self.assertEqual(self.parsed.content[106].division, "prov")
+        self.assertEqual(self.parsed.content[106].name, "Fars")
+        self.assertEqual(self.parsed.content[106].region_type, "iqlim")
+        self.assertEqual(self.parsed.content[106].subdivision, "reg1")
+        self.assertEqual(self.parsed.content[106].subdivisions, ["Istakhr", "Sabur"])
+        self.assertEqual(self.parsed.content[107].subdivision, "sttl")
+        self.assertEqual(self.parsed.content[107].subdivisions, ["Bayda", "Abarquh"])
+
+    def test_geo(self):
+        graph = geo.route_graph(self.parsed)
+        self.assertEqual(graph.neighbors("Istakhr"), [("Bayda", 12.0), ("Shiraz city", 12.0)])
+        self.assertEqual(graph.shortest_path("Bayda", "Kazarun"),
+                         (25.0, ["Bayda", "Istakhr", "Shiraz city", "Kazarun"]))
+        self.assertEqual(graph.distance("Kazarun", "Istakhr"), 13.0)
+
+        directed = geo.route_graph([self.parsed], directed=True)
+        directed.precompute()
+        self.assertIsNone(directed.shortest_path("Kazarun", "Bayda"))
+        self.assertEqual(directed.distance("Kazarun", "Bayda"), float("inf"))
+        with self.assertRaisesRegex(ValueError, "Unknown place: Baghdad"):
+            graph.shortest_path("Bayda", "Baghdad")
+        with self.assertRaisesRegex(ValueError, "Unknown place: Baghdad"):
+            graph.distance("Baghdad", "Bayda")
+        with self.assertRaises(ValueError):
+            graph.neighbors("Baghdad")
+
+        regions = geo.region_hierarchy(self.parsed)
+        self.assertEqual(regions.ancestors("Bayda"), ["Istakhr", "Fars"])
+        self.assertEqual(regions.children("Istakhr"), ["Bayda", "Abarquh"])
+
+
+class TestParser(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestParser, self).__init__(*args, **kwargs)
+        with open(os.path.join(os.path.dirname(__file__), "test.md"), "r") as f:
+            lines = f.read().splitlines()
+        # Snippets of the test file, as submitted to a backend
+        self.texts = ["\n".join([lines[0], *lines[n:n + 400]]) for n in range(1, len(lines), 400)]
+        self.parser = oimdp.Parser()
+
+    def dumps(self, documents):
+        return [json.dumps(export.to_dict(d), ensure_ascii=False) for d in documents]
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.parser.strict = True
+        with self.assertRaises(ValueError):
+            oimdp.Parser(errors="ignore")
+
+    def test_parse_many(self):
+        expected = self.dumps(oimdp.parse(text) for text in self.texts)
+        self.assertEqual(self.dumps(self.parser.parse_many(self.texts)), expected)
+        self.assertEqual(self.dumps(self.parser.parse_many(self.texts, threads=4)), expected)
+
+    def test_parse_many_lazily(self):
+        read = []
+
+        def texts():
+            for n in range(100):
+                read.append(n)
+                yield self.texts[n % len(self.texts)]
+
+        documents = self.parser.parse_many(texts(), threads=2)
+        self.assertEqual(read, [])
+        next(documents)
+        self.assertLessEqual(len(read), 5)
+        self.assertEqual(sum(1 for _ in documents), 99)
+        self.assertEqual(len(read), 100)
+
+    def test_threads(self):
+        expected = self.dumps(self.parser.parse_many(self.texts))
+        results = []
+
+        def work(offset):
+            # Each thread parses all snippets, starting from a different one
+            order = [(offset + n) % len(self.texts) for n in range(len(self.texts))]
+            documents = self.parser.parse_many([self.texts[n] for n in order])
+            results.append(dict(zip(order, self.dumps(documents))))
+
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 8)
+        for result in results:
+            self.assertEqual([result[n] for n in range(len(self.texts))], expected)
+
+    @unittest.skipIf(getattr(sys, "_is_gil_enabled", lambda: True)() or (os.cpu_count() or 1) < 4,
+                     "needs a free-threaded Python build and 4 CPUs")
+    def test_scaling(self):
+        texts = self.texts * 4
+
+        def throughput(threads):
+            start = time.perf_counter()
+            for _ in self.parser.parse_many(texts, threads=threads):
+                pass
+            return len(texts) / (time.perf_counter() - start)
+
+        throughput(4)
+        self.assertGreater(throughput(4), 2 * throughput(1))
+
+
+class TestOpenTags(unittest.TestCase):
+
+    text = ("######OpenITI#\n# a @RES@TYPE@Place@ b @RES@TYPE@Place@-@fr@ c @MLX@NER@Person@-@0f@\n"
+            "~~d @USER@CAT_SUB@ e @RES@TYPE@Place@ f @ANN@CAT_SUB_X@\n")
+
+    def test_registry(self):
+        parsed = oimdp.parse(self.text)
+        registry = opentags.OpenTagRegistry(parsed)
+        self.assertEqual(len(registry), 6)
+        self.assertEqual([t.orig for t in registry.unreviewed()],
+                         ["@RES@TYPE@Place@", "@MLX@NER@Person@-@0f@", "@RES@TYPE@Place@"])
+        self.assertEqual({c: len(tags) for c, tags in registry.unreviewed_by_category().items()},
+                         {"Place": 2, "Person": 1})
+        self.assertEqual([t.orig for t in registry.unreviewed("Person")], ["@MLX@NER@Person@-@0f@"])
+        self.assertEqual([t.t_subsubtype for t in registry.select(OpenTagUser, t_type="CAT", t_subtype="SUB")],
+                         [None, "X"])
+        self.assertEqual([(t.review, line.line_index) for t, line in registry.select(OpenTagAuto, context=True, resp="RES")],
+                         [(None, 1), ("fr", 1), (None, 2)])
+        self.assertEqual(list(registry.select(OpenTagAuto, category="Other")), [])
+        with self.assertRaises(ValueError):
+            list(registry.select(OpenTagAuto, user="USER"))
+
+    def test_counts(self):
+        counts = opentags.OpenTagRegistry(oimdp.parse(self.text)).counts()
+        self.assertEqual(counts.by("OpenTagAuto", "category"), {"Place": 3, "Person": 1})
+        self.assertEqual((counts.total("OpenTagAuto"), counts.total("OpenTagUser")), (4, 2))
+        self.assertEqual(counts.get("OpenTagUser", "user", "USER"), 1)
+        merged = sum([counts, counts], opentags.TagCounts())
+        self.assertEqual(merged.by("OpenTagAuto", "unreviewed_category"), {"Place": 4, "Person": 2, None: 2})
+        self.assertEqual(counts.total("OpenTagAuto"), 4)
+
+
+class TestErrors(unittest.TestCase):
+
+    text = ("######OpenITI#\n#META#Header#End#\n# a PageV01Px b\nPageV02\n"
+            "~~ @PER12 ok @PERx two three PageV01P003\n")
+
+    def test_raise(self):
+        with self.assertRaisesRegex(Exception, "Could not parse page number at line: 3"):
+            oimdp.parse(self.text)
+        with self.assertRaisesRegex(Exception, "Could not parse named entity at line: 2"):
+            oimdp.parse("######OpenITI#\n# a @PER1 b\n")
+        with self.assertRaises(ValueError):
+            oimdp.parse(self.text, errors="ignore")
+
+    def test_collect(self):
+        streamed = []
+        parsed = oimdp.parse(self.text, errors="collect", on_diagnostic=streamed.append)
+        self.assertEqual([(d.line_index, d.column, d.text, d.kind) for d in parsed.diagnostics], [
+            (2, 4, "PageV01Px", "PageNumber"),
+            (3, 0, "PageV02", "PageNumber"),
+            (4, 13, "@PERx", "NamedEntity"),
+        ])
+        self.assertEqual(streamed, parsed.diagnostics)
+        self.assertEqual(str(parsed.diagnostics[0]),
+                         "3:5: Could not parse page number at line: 3 (PageNumber: PageV01Px)")
+        # Bad tokens are kept as text
+        self.assertIsInstance(parsed.content[1].parts[0], TextPart)
+        self.assertEqual(parsed.content[1].parts[0].orig, " a PageV01Px b")
+        self.assertEqual([type(p) for p in parsed.content[2].parts], [TextPart, NamedEntity, TextPart, PageNumber])
+        self.assertEqual(parsed.content[2].parts[1].text, "ok @PERx ")
+        self.assertEqual(parsed.unparsed_lines, [(1, "#META#Header#End#"), (3, "PageV02")])
+        out = io.StringIO()
+        oimdp.write(parsed, out)
+        self.assertEqual(out.getvalue(), self.text)
+        self.assertEqual(export.to_dict(parsed)["diagnostics"][1]["text"], "PageV02")
+
+    def test_clean(self):
+        root = os.path.dirname(__file__)
+        with open(os.path.join(root, "test.md"), "r") as f:
+            self.assertEqual(oimdp.parse(f.read(), errors="collect").diagnostics, [])
+
+
+class TestWriter(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestWriter, self).__init__(*args, **kwargs)
+        root = os.path.dirname(__file__)
+        filepath = os.path.join(
+            root, "test.md"
+        )
+        test_file = open(filepath, "r")
+        self.text = test_file.read()
+        test_file.close()
+        self.parsed = oimdp.parse(self.text, strict=True)
+
+    def write(self, document):
+        out = io.StringIO()
+        oimdp.write(document, out)
+        return out.getvalue()
+
+    def test_round_trip(self):
+        self.assertEqual(self.write(self.parsed), self.text)
+
+    def test_line_breaks(self):
+        for text in ["######OpenITI#\r\n# a b\r\n~~c\r\n", "######OpenITI#\r# a b", "######OpenITI#"]:
+            self.assertEqual(self.write(oimdp.parse(text)), text)
+        crlf = self.text.replace("\n", "\r\n")
+        self.assertEqual(self.write(oimdp.parse(crlf)), crlf)
+
+    def test_named_entity_whitespace(self):
+        text = "######OpenITI#\n~~ a @SOC02  b   c  d \n~~ e @T11 f\n"
+        self.assertEqual(self.write(oimdp.parse(text)), text)
+
+    def test_changed_structures(self):
+        self.parsed.content[71].parts[1].extent = 3
+        self.parsed.content[71].parts[1].ne_type = "per"
+        self.parsed.content[96].parts[1].page = "002"
+        self.parsed.content[36].dic_type = "lex"
+        self.parsed.content[58].level = 2
+        reparsed = oimdp.parse(self.write(self.parsed))
+
+        self.assertEqual(reparsed.content[71].parts[1].ne_type, "per")
+        self.assertEqual(reparsed.content[71].parts[1].extent, 3)
+        self.assertEqual(reparsed.content[71].parts[1].text, 'نزيل: 1"018: واسط.. ')
+        self.assertEqual(str(reparsed.content[96].parts[1]), "Vol. 01M, p. 002")
+        self.assertEqual(reparsed.content[36].dic_type, "lex")
+        self.assertEqual(reparsed.content[58].level, 2)
+        self.assertEqual(reparsed.content[58].value, self.parsed.content[58].value)
+
+
+class TestMemory(unittest.TestCase):
+
+    def test_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            self.assertIsNone(memory.check(baseline_path=baseline)[0][2])
+            peaks = memory.update(baseline_path=baseline)
+            self.assertGreater(peaks["test.md"], 0)
+            self.assertFalse(memory.check(baseline_path=baseline, threshold=0.5)[0][3])
+            with open(baseline, "w", encoding="utf-8") as f:
+                json.dump({memory.python_version(): {"test.md": peaks["test.md"] // 2}}, f)
+            name, peak, expected, regressed = memory.check(baseline_path=baseline)[0]
+            self.assertTrue(regressed)
+
+
+class TestToc(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestToc, self).__init__(*args, **kwargs)
+        self.path = os.path.join(os.path.dirname(__file__), "test.md")
+        with open(self.path, "rb") as f:
+            self.data = f.read()
+        self.parsed = oimdp.parse(self.data.decode("utf-8"))
+
+    def flatten(self, entries):
+        for entry in entries:
+            yield entry
+            yield from self.flatten(entry.children)
+
+    def test_same_as_parser(self):
+        expected = []
+        for n, c in enumerate(self.parsed.content):
+            if isinstance(c, SectionHeader):
+                expected.append((SectionHeader, c.value, c.level, None, c.line_index))
+            elif isinstance(c, (BioOrEvent, DictionaryUnit)):
+                following = self.parsed.content[n + 1]
+                title = following.text_only if getattr(following, "line_index", None) == c.line_index else None
+                unit_type = c.be_type if isinstance(c, BioOrEvent) else c.dic_type
+                expected.append((type(c), title, None, unit_type, c.line_index))
+        with open(self.path, "rb") as f:
+            toc = oimdp.extract_toc(f)
+        entries = list(self.flatten(toc))
+        self.assertEqual([(e.structure, e.title, e.level, e.unit_type, e.line_index) for e in entries], expected)
+        for entry in entries:
+            self.assertTrue(self.data[entry.offset:].startswith(b"###"))
+        self.assertEqual([e.to_dict() for e in oimdp.extract_toc(self.data.decode("utf-8"))],
+                         [e.to_dict() for e in toc])
+
+    def test_nesting(self):
+        toc = oimdp.extract_toc("######OpenITI#\n### | A\n### ||| B\n### $ Bio\n### || C\n### | D\n### $DIC_NIS$ E\n")
+        self.assertEqual([(e.title, [c.title for c in e.children]) for e in toc], [(" A", [" B", " C"]), (" D", [" E"])])
+        self.assertEqual([c.title for c in toc[0].children[0].children], [" Bio"])
+        self.assertEqual(toc[1].children[0].unit_type, "nis")
+        self.assertEqual([e.offset for e in self.flatten(toc)], [15, 23, 33, 43, 52, 60])
+
+    def test_offsets_with_crlf(self):
+        data = "######OpenITI#\r\n# ا\r\n### | A\r\n### || B\r\n".encode("utf-8")
+        offsets = [e.offset for e in self.flatten(oimdp.extract_toc(data))]
+        self.assertEqual(offsets, [data.index(b"### |"), data.index(b"### ||")])
+        self.assertEqual([e.offset for e in self.flatten(oimdp.extract_toc(io.BytesIO(data)))], offsets)
+        self.assertEqual([e.offset for e in self.flatten(oimdp.extract_toc(data.decode("utf-8")))], offsets)
+        text_file = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8")
+        self.assertEqual([e.offset for e in self.flatten(oimdp.extract_toc(text_file))], [None, None])
+
+
+class TestConcordance(unittest.TestCase):
+
+    def test_concordance(self):
+        path = os.path.join(os.path.dirname(__file__), "test.md")
+        hits = list(oimdp.concordance([path], r"^محمد$", window=5))
+        self.assertEqual(len(hits), 394)
+        self.assertEqual(hits[0].left, "- صمعة بنت أحمد بن")
+        self.assertEqual(hits[0].keyword, "محمد")
+        self.assertEqual(hits[0].right, "بن عبيد الله الرئيس النيسابورية")
+        self.assertEqual((hits[0].line_index, hits[0].position, hits[0].page), (50, 6, "030"))
+
+        first = oimdp.concordance([path, path], r"^محمد$", window=5, limit=3)
+        self.assertEqual([str(h) for h in first], [str(h) for h in hits[:3]])
+        sample = oimdp.concordance([path, path], r"^محمد$", window=5, limit=3, sample=True, seed=1, processes=2)
+        self.assertEqual(len(sample), 3)
+        self.assertEqual([str(h) for h in sample],
+                         [str(h) for h in oimdp.concordance([path, path], r"^محمد$", window=5, limit=3,
+                                                            sample=True, seed=1)])
+
+    def test_stream_lazily(self):
+        read = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("######OpenITI#\n# a key b\n")
+
+            def sources():
+                for n in range(20):
+                    read.append(n)
+                    yield path
+
+            hits = oimdp.concordance(sources(), "key", window=5, processes=2)
+            self.assertEqual(read, [])
+            self.assertEqual(str(next(hits)), "a [key] b")
+            self.assertLessEqual(len(read), 5)
+            hits.close()
+            self.assertLessEqual(len(read), 5)
+
+    def test_context_across_lines(self):
+        document = oimdp.parse("######OpenITI#\n# a b PageV01P002 key\n~~c Milestone300 d key\n")
+        hits = list(kwic.scan(document, re.compile("key"), window=2))
+        self.assertEqual([(h.left, h.right, h.page, h.milestone) for h in hits],
+                         [("a b", "c d", "002", None), ("c d", "", "002", "Milestone300")])
+
+    def test_no_context(self):
+        document = oimdp.parse("######OpenITI#\n# a key b key\n")
+        hits = list(kwic.scan(document, re.compile("key"), window=0))
+        self.assertEqual([(h.left, h.keyword, h.right) for h in hits], [("", "key", ""), ("", "key", "")])
+
+
+class TestSidecar(unittest.TestCase):
+
+    def test_parse_range(self):
+        root = os.path.dirname(__file__)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.md")
+            shutil.copy(os.path.join(root, "test.md"), path)
+            parsed = oimdp.parse_range(path, from_page="010", to_page="011", volume="01")
+            self.assertTrue(os.path.exists(path + sidecar.SIDECAR_EXTENSION))
+            built = sidecar.build_index(path)
+            with sidecar.load_index(path) as index:
+                self.assertEqual(index.page(0)[:2], ["00", "000"])
+                self.assertEqual(index.header(0)[0], 1)
+                self.assertEqual([index.page(n) for n in range(index.count("pages"))], built["pages"])
+                self.assertEqual([index.header(n) for n in range(index.count("headers"))], built["headers"])
+                self.assertEqual([index.milestone(n) for n in range(index.count("milestones"))],
+                                 built["milestones"])
+                for p in built["pages"]:
+                    same = [q for q in built["pages"] if q[:2] == p[:2]]
+                    self.assertEqual(index.page(index.find_page(p[1], p[0])), same[0])
+                    self.assertEqual(index.page(index.find_page(p[1], p[0], last=True)), same[-1])
+                self.assertEqual(index.find_page("010"), index.find_page("010", "01"))
+                with self.assertRaises(Exception):
+                    index.find_page("999")
+
+            pages = [str(p) for p in parsed.select(PageNumber)]
+            self.assertEqual(pages, ["Vol. 01, p. 009", "Vol. 01, p. 011"])
+            # Page 010 is in several volumes, the range stays in the first one
+            self.assertEqual(sidecar.read_range(path, "010", "011"), sidecar.read_range(path, "010", "011", "01"))
+            self.assertEqual(str(parsed.magic_value), "######OpenITI#")
+            self.assertTrue(parsed.get_clean_text().strip().startswith("الأسد بن الغوث:"))
+
+            # The index is rebuilt when the file changes
+            with open(path, "a") as f:
+                f.write("~~PageV03P001\n")
+            with sidecar.load_index(path) as index:
+                self.assertEqual(index.page(index.count("pages") - 1)[:2], ["03", "001"])
+            with self.assertRaises(Exception):
+                oimdp.parse_range(path, from_page="001", volume="04")
+
+
+    def test_metadata_and_headers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("######OpenITI#\n#META# PageV01P010 ms9\n#META#Header#End#\n### | a PageV01P010\n"
+                        "# b PageV01P001\n# c ms1\n# d PageV01P010\n")
+            index = sidecar.build_index(path)
+            self.assertEqual([p[:2] for p in index["pages"]], [["01", "001"], ["01", "010"]])
+            self.assertEqual([m[0] for m in index["milestones"]], ["ms1"])
+            self.assertEqual(sidecar.read_range(path, "010", "010", "01"),
+                             "######OpenITI#\n# b PageV01P001\n# c ms1\n# d PageV01P010\n")
+
+
+    def test_unwritable_sidecar(self):
+        root = os.path.dirname(__file__)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "test.md")
+            shutil.copy(os.path.join(root, "test.md"), path)
+            # The sidecar file cannot be written where a directory is in the way
+            os.mkdir(path + sidecar.SIDECAR_EXTENSION)
+            parsed = oimdp.parse_range(path, from_page="010", to_page="011", volume="01")
+            self.assertEqual([str(p) for p in parsed.select(PageNumber)], ["Vol. 01, p. 009", "Vol. 01, p. 011"])
+            self.assertEqual(sorted(os.listdir(tmp)), ["test.md", "test.md" + sidecar.SIDECAR_EXTENSION])
+
+
+class TestReuse(unittest.TestCase):
+
+    def test_reuse(self):
+        shared = "وجمع العرب تحت لواء الرسول محمد عليه الصلاة والسلام وما يضاف إلى ذلك من الحديث عن نشأة النبي"
+        a = oimdp.parse(f"######OpenITI#\n# {shared} Milestone300\n~~ block unique to the first text ms2\n")
+        b = oimdp.parse(f"######OpenITI#\n# something else entirely Milestone300\n# {shared} ms2\n")
+        self.assertEqual([n for n, _ in reuse.milestone_blocks(a)], [0, 1])
+
+        hasher = reuse.MinHasher(num_perm=32)
+        index_a = reuse.index_documents([("a", a)], hasher, reuse.LSHIndex(32, 8))
+        index_b = reuse.index_documents([("b", b)], hasher, reuse.LSHIndex(32, 8))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index")
+            index_b.save(path)
+            index_a.merge(reuse.LSHIndex.load(path))
+        self.assertEqual(list(index_a.candidates(threshold=0.5)), [(("a", 0), ("b", 1), 1.0)])
+        self.assertEqual(hasher.signatures([shared, ""])[0], hasher.signature(hasher.shingles(shared)))
+
+
+class TestExtract(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super(TestExtract, self).__init__(*args, **kwargs)
+        root = os.path.dirname(__file__)
+        self.filepath = os.path.join(
+            root, "test.md"
+        )
+
+    def test_riwayat(self):
+        with open(self.filepath, "r") as test_file:
+            batches = list(oimdp.extract.riwayat(test_file))
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0]["line"], [84])
+        self.assertEqual(batches[0]["isnad"], ["this section contains isnād"])
+        self.assertEqual(batches[0]["matn"], ["this section contains matn"])
+        self.assertEqual(batches[0]["hukm"], ["this section contains ḥukm ."])
+        self.assertEqual(batches[0]["page"], ["030"])
+
+    def test_riwayat_batches(self):
+        text = "######OpenITI#\n# $RWY$ a @MATN@ b PageV01P002\n~~c @HUKM@ d\nPageV01P003\n~~e\n" \
+            "# $RWY$ f Milestone300\n# g\n# $RWY$ h\n"
+        batches = list(oimdp.extract.riwayat(text, batch_size=2))
+        self.assertEqual([b["id"] for b in batches], [[0, 1], [2]])
+        self.assertEqual(batches[0]["isnad"], ["a", "f"])
+        self.assertEqual(batches[0]["matn"], ["b c", ""])
+        self.assertEqual(batches[0]["hukm"], ["d e", ""])
+        self.assertEqual(batches[0]["page"], [None, "003"])
+        self.assertEqual(batches[1]["milestone"], ["Milestone300"])
+
+    def test_entities(self):
+        with open(self.filepath, "r") as test_file:
+            parsed = oimdp.parse(test_file.read())
+        expected = []
+        for item, line, _ in parsed.select(LinePart, context=True):
+            if isinstance(item, NamedEntity):
+                expected.append((line.line_index, "NamedEntity", item.ne_type, item.prefix, item.extent,
+                                 item.text.strip()))
+            elif isinstance(item, (Date, Age)):
+                expected.append((line.line_index, type(item).__name__, getattr(item, "date_type", "age"), None, None,
+                                 item.value))
+        with open(self.filepath, "r") as test_file:
+            batches = list(oimdp.extract.entities(test_file, doc="test"))
+        self.assertEqual(len(batches), 1)
+        columns = [batches[0][c] for c in ["line", "structure", "type", "prefix", "extent", "text"]]
+        self.assertEqual(list(zip(*columns)), expected)
+        self.assertEqual(set(batches[0]["doc"]), {"test"})
+
+    def test_entities_context(self):
+        text = "######OpenITI#\n#META# @PER11 x\n# a @PER02 b PageV01P002 c d Milestone300 @YD300\n" \
+            "~~@TOP12 e @SRC11 f PageV01P003\n### | @PER11 g\n### $ @SOC11 h\n# @PERx i\n"
+        batches = list(oimdp.extract.entities(text, batch_size=3))
+        self.assertEqual([len(b["line"]) for b in batches], [3, 2])
+        rows = [tuple(b[c][n] for c in ["line", "type", "text", "page", "milestone"])
+                for b in batches for n in range(len(b["line"]))]
+        self.assertEqual(rows, [
+            (2, "per", "b", None, None),
+            (2, "death", "300", "002", "Milestone300"),
+            (3, "top", "e", "002", "Milestone300"),
+            (3, "src", "f", "002", "Milestone300"),
+            (5, "soc", "h", "003", "Milestone300"),
+        ])
+
+    def test_context_skips_metadata(self):
+        text = "######OpenITI#\n#META# PageV09P009 ms9\n### | PageV09P010\n# @PER11 a\n"
+        self.assertEqual(list(oimdp.parse(text).select(PageNumber)), [])
+        rows = list(oimdp.extract.entities(text))[0]
+        self.assertEqual((rows["page"], rows["milestone"]), ([None], [None]))
+        self.assertEqual(list(oimdp.extract.riwayat(text + "# $RWY$ b\n"))[0]["page"], [None])
+
+
+@unittest.skipUnless(hasattr(os, "fork") and hasattr(socket, "AF_UNIX"), "requires fork and Unix sockets")
+class TestServe(unittest.TestCase):
+
+    def test_pipelined_requests(self):
+        root = os.path.dirname(__file__)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "oimdp.sock")
+            env = dict(os.environ, PYTHONPATH=os.path.abspath(os.path.join(root, os.path.pardir)))
+            server = subprocess.Popen(
+                [sys.executable, "-m", "oimdp", "serve", "--socket", path, "--workers", "2"], env=env)
+            try:
+                for _ in range(100):
+                    if os.path.exists(path):
+                        break
+                    time.sleep(0.1)
+                requests = [
+                    {"id": 1, "op": "health"},
+                    {"id": 2, "path": os.path.join(root, "test.md"), "strict": True},
+                    {"id": 3, "text": "######OpenITI#\n# text @YD597 text"},
+                    {"id": 4, "text": "not mARkdown"},
+                    {"id": 5, "op": "metrics"},
+                ]
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    client.connect(path)
+                    client.sendall(b"".join([json.dumps(r).encode("utf-8") + b"\n" for r in requests]))
+                    rfile = client.makefile("rb")
+                    responses = [json.loads(rfile.readline()) for _ in requests]
+            finally:
+                server.terminate()
+                server.wait()
+
+        self.assertEqual([r["id"] for r in responses], [1, 2, 3, 4, 5])
+        self.assertTrue(responses[0]["ok"])
+        self.assertEqual(responses[1]["document"]["content"][53]["parts"][1]["date_type"], "death")
+        self.assertEqual(responses[2]["document"]["content"][1]["parts"][1]["value"], "597")
+        self.assertFalse(responses[3]["ok"])
+        self.assertEqual(responses[4]["metrics"]["requests"], 4)
+        self.assertEqual(responses[4]["metrics"]["errors"], 1)
+
+    def test_socket_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "0845Maqrizi.Mawaciz")
+            with open(path, "w") as f:
+                f.write("######OpenITI#\n")
+            with self.assertRaises(FileExistsError):
+                serve.serve(path, workers=1)
+            with open(path) as f:
+                self.assertEqual(f.read(), "######OpenITI#\n")
+
+            # Only the socket bound by a server is deleted
+            path = os.path.join(tmp, "oimdp.sock")
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as old:
+                old.bind(path)
+                identity = serve.socket_identity(os.stat(path))
+            os.unlink(path)
+            time.sleep(0.01)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as new:
+                new.bind(path)
+                serve.remove_socket(path, identity)
+                self.assertTrue(os.path.exists(path))
+                serve.remove_socket(path, serve.socket_identity(os.stat(path)))
+                self.assertFalse(os.path.exists(path))
 
 
 if __name__ == "__main__":